@@ -0,0 +1,133 @@
+"""
+JSON hotel search API.
+/api/hotels takes the same filters as the /hotels page (search, city_id,
+category_id, min_price, max_price, min_rating) plus:
+
+- fields: comma-separated list of fields to return (default: all)
+- limit, after, before: page size and keyset cursors, as on /hotels
+- format=ndjson (or Accept: application/x-ndjson): stream every matching
+  hotel as one JSON object per line, ignoring pagination. Rows are read in
+  batches through a server-side cursor so exports run in constant memory.
+"""
+
+import json
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from sqlalchemy import select
+from app import app, db
+from models import City, HotelCategory, Hotel
+from replica import read_replica
+from search import filter_hotels, hotel_search_params, search_hotels, search_page
+
+app.config.setdefault("API_MAX_PAGE_SIZE", 100)
+app.config.setdefault("API_STREAM_BATCH_SIZE", 1000)
+
+api_bp = Blueprint('api', __name__)
+
+# Field name -> column it is read from
+FIELDS = {
+    'id': Hotel.id,
+    'name': Hotel.name,
+    'description': Hotel.description,
+    'address': Hotel.address,
+    'rating': Hotel.rating,
+    'price_per_night': Hotel.price_per_night,
+    'amenities': Hotel.amenities,
+    'image_url': Hotel.image_url,
+    'is_available': Hotel.is_available,
+    'created_at': Hotel.created_at,
+    'city_id': Hotel.city_id,
+    'category_id': Hotel.category_id,
+    'city': City.name,
+    'category': HotelCategory.name,
+}
+
+
+class APIError(Exception):
+    """Client error reported as a JSON body with a 400 status"""
+
+
+@api_bp.errorhandler(APIError)
+def api_error(error):
+    return jsonify({'error': str(error)}), 400
+
+
+def requested_fields():
+    """Fields named in the ``fields`` parameter, or every field"""
+    value = request.args.get('fields')
+    if not value:
+        return list(FIELDS)
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in FIELDS]
+    if unknown:
+        raise APIError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def serialize(values, fields):
+    """Build a JSON-ready dict from values listed in ``fields`` order"""
+    record = dict(zip(fields, values))
+    if record.get('created_at') is not None:
+        record['created_at'] = record['created_at'].isoformat()
+    return record
+
+
+def hotel_values(hotel, fields):
+    """Values of ``fields`` for a loaded Hotel"""
+    related = {'city': hotel.city.name, 'category': hotel.category.name}
+    return [related[field] if field in related else getattr(hotel, field) for field in fields]
+
+
+def wants_ndjson():
+    if request.args.get('format') == 'ndjson':
+        return True
+    best = request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson'])
+    return best == 'application/x-ndjson'
+
+
+@api_bp.route('/hotels')
+@read_replica
+def hotels():
+    """Search hotels as JSON, or stream them as NDJSON"""
+    params = hotel_search_params(request.args)
+    fields = requested_fields()
+    if wants_ndjson():
+        return Response(stream_with_context(stream_hotels(params, fields)),
+                        mimetype='application/x-ndjson')
+
+    limit = request.args.get('limit', app.config['HOTELS_PER_PAGE'], type=int)
+    limit = max(1, min(limit, app.config['API_MAX_PAGE_SIZE']))
+    page = search_page(Hotel.with_relations(), params,
+                       after=request.args.get('after'),
+                       before=request.args.get('before'),
+                       per_page=limit)
+    return jsonify({
+        'hotels': [serialize(hotel_values(hotel, fields), fields) for hotel in page],
+        'next': page.next_cursor,
+        'prev': page.prev_cursor,
+    })
+
+
+def stream_hotels(params, fields):
+    """Yield matching hotels as NDJSON lines without materializing ORM objects"""
+    statement = (select(*(FIELDS[field] for field in fields))
+                 .select_from(Hotel)
+                 .join(City, Hotel.city_id == City.id)
+                 .join(HotelCategory, Hotel.category_id == HotelCategory.id))
+    statement = filter_hotels(statement, params)
+    batch_size = app.config['API_STREAM_BATCH_SIZE']
+
+    if params['search']:
+        # Every filtered match, uncapped: fetch each batch of ids and emit it in rank order
+        ranking = [hotel_id for hotel_id, _ in search_hotels(params['search'], params)]
+        statement = statement.add_columns(Hotel.id)
+        for start in range(0, len(ranking), batch_size):
+            batch = ranking[start:start + batch_size]
+            rows = {row[-1]: row[:-1] for row in db.session.execute(statement.where(Hotel.id.in_(batch)))}
+            for hotel_id in batch:
+                if hotel_id in rows:
+                    yield json.dumps(serialize(rows[hotel_id], fields)) + '\n'
+        return
+
+    result = db.session.execute(statement.order_by(Hotel.id).execution_options(yield_per=batch_size))
+    for row in result:
+        yield json.dumps(serialize(row, fields)) + '\n'
@@ -1,18 +1,32 @@
 import os
 import logging
-from flask import Flask
+import time
+from flask import Flask, g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_login import LoginManager
+from sqlalchemy import event
+from sqlalchemy.exc import DisconnectionError
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import Pool
 from werkzeug.middleware.proxy_fix import ProxyFix
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+class RoutingSession(Session):
+    """Sends plain SELECTs to the 'replica' bind during requests marked with
+    replica.read_replica; flushes, DML and locking reads use the primary"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and has_request_context() and g.get('use_replica')
+                and getattr(clause, 'is_select', False) and clause._for_update_arg is None):
+            return self._db.engines['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
 
 # Create the app
 app = Flask(__name__)
@@ -21,14 +35,61 @@ app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
 # Configure the database
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
+if os.environ.get("DATABASE_REPLICA_URL"):
+    app.config["SQLALCHEMY_BINDS"] = {"replica": os.environ["DATABASE_REPLICA_URL"]}
+
+# Connection pool, shared by the primary and the replica. Pool size, overflow
+# and timeout keep SQLAlchemy's defaults unless set. DB_PRE_PING is 'always'
+# (a round-trip on every checkout), 'idle' (only for connections idle longer
+# than DB_PRE_PING_IDLE seconds) or 'never'.
+app.config["DB_PRE_PING"] = os.environ.get("DB_PRE_PING", "always")
+app.config["DB_PRE_PING_IDLE"] = float(os.environ.get("DB_PRE_PING_IDLE", 30))
 app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
+    "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 300)),
+    "pool_pre_ping": app.config["DB_PRE_PING"] == "always",
 }
+for option, variable, cast in (("pool_size", "DB_POOL_SIZE", int), ("max_overflow", "DB_MAX_OVERFLOW", int),
+                               ("pool_timeout", "DB_POOL_TIMEOUT", float)):
+    if os.environ.get(variable):
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"][option] = cast(os.environ[variable])
+
+@event.listens_for(Pool, 'checkin')
+def _mark_checkin(dbapi_connection, connection_record):
+    connection_record.info['checked_in'] = time.monotonic()
+
+@event.listens_for(Pool, 'checkout')
+def _ping_idle_connection(dbapi_connection, connection_record, connection_proxy):
+    if app.config["DB_PRE_PING"] != "idle":
+        return
+    checked_in = connection_record.info.get('checked_in')
+    if checked_in is None or time.monotonic() - checked_in < app.config["DB_PRE_PING_IDLE"]:
+        return
+    try:
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("SELECT 1")
+        finally:
+            cursor.close()
+    except Exception as e:
+        # The pool discards this connection and checks out a fresh one
+        raise DisconnectionError() from e
+
+# Number of hotels shown per page on the public listing and the admin list
+app.config["HOTELS_PER_PAGE"] = int(os.environ.get("HOTELS_PER_PAGE", 24))
+app.config["ADMIN_HOTELS_PER_PAGE"] = int(os.environ.get("ADMIN_HOTELS_PER_PAGE", 50))
 
 # Initialize the app with the extension
 db.init_app(app)
 
+def _dispose_engines_after_fork():
+    # Connections pooled before a fork (gunicorn --preload) belong to the parent;
+    # forget them without closing so each worker opens its own
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+os.register_at_fork(after_in_child=_dispose_engines_after_fork)
+
 # Initialize Flask-Login
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -38,11 +99,36 @@ login_manager.login_message_category = 'info'
 
 @login_manager.user_loader
 def load_user(user_id):
-    from models import User
-    return User.query.get(int(user_id))
-
-with app.app_context():
-    # Import models to ensure tables are created
-    import models  # noqa: F401
-    db.create_all()
-    logging.info("Database tables created")
+    from user_cache import load_user as load_cached_user
+    return load_cached_user(int(user_id))
+
+def configure_logging(level=None):
+    """Structured, queued logging for entry points; see logs.py"""
+    from logs import configure_logging
+    configure_logging(level)
+
+def init_db():
+    """Create missing tables and, on PostgreSQL, the search function and
+    indexes (the dev server; deployments run migrate.py or
+    `flask --app main init-db`). Importing the app never touches the schema."""
+    from migrate import create_search_indexes
+    with app.app_context():
+        db.create_all()
+        create_search_indexes()
+    logger.info("Database tables created")
+
+def create_app(config=None):
+    """The app with logging set up and every route registered, e.g. for
+    `gunicorn 'app:create_app()'`. ``config`` overrides settings before the
+    route modules read them."""
+    if config:
+        app.config.update(config)
+    configure_logging()
+    import routes  # noqa: F401
+    return app
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create missing tables and indexes"""
+    from migrate import migrate
+    migrate()
@@ -1,8 +1,12 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required, current_user
 from urllib.parse import urlparse as url_parse
+from sqlalchemy.exc import IntegrityError
 from app import db
+from constraints import taken_values
+from user_cache import invalidate_user
 from models import User
+from passwords import PasswordHashingBusy
 from forms import LoginForm, RegistrationForm
 
 auth_bp = Blueprint('auth', __name__)
@@ -16,7 +20,15 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
-        if user and user.check_password(form.password.data):
+        try:
+            valid = user is not None and user.check_password(form.password.data)
+            if valid and user.password_needs_rehash():
+                user.set_password(form.password.data)
+                db.session.commit()
+        except PasswordHashingBusy:
+            flash('The server is busy. Please try logging in again in a moment.', 'warning')
+            return render_template('login.html', form=form), 503, {'Retry-After': '5'}
+        if valid:
             login_user(user, remember=form.remember_me.data)
             next_page = request.args.get('next')
             if not next_page or url_parse(next_page).netloc != '':
@@ -35,23 +47,30 @@ def register():
     
     form = RegistrationForm()
     if form.validate_on_submit():
-        # Check if user already exists
-        if User.query.filter_by(username=form.username.data).first():
-            flash('Username already exists. Please choose a different one.', 'danger')
-            return render_template('register.html', form=form)
-        
-        if User.query.filter_by(email=form.email.data).first():
-            flash('Email already registered. Please use a different email.', 'danger')
-            return render_template('register.html', form=form)
-        
-        # Create new user
+        # Create new user; the unique constraints reject a taken username or email
         user = User(
             username=form.username.data,
             email=form.email.data
         )
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except PasswordHashingBusy:
+            flash('The server is busy. Please try again in a moment.', 'warning')
+            return render_template('register.html', form=form), 503, {'Retry-After': '5'}
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            taken = taken_values(User, username=form.username.data, email=form.email.data)
+            if 'username' in taken:
+                flash('Username already exists. Please choose a different one.', 'danger')
+            if 'email' in taken:
+                flash('Email already registered. Please use a different email.', 'danger')
+            if not taken:
+                flash('Registration failed, please try again.', 'danger')
+            return render_template('register.html', form=form)
+        invalidate_user(user.id)
         
         flash('Registration successful! You can now log in.', 'success')
         return redirect(url_for('auth.login'))
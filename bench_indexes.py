@@ -0,0 +1,121 @@
+"""
+Query plan benchmark for the hotel search indexes.
+Seeds a large synthetic catalogue, then prints the plan and timing of the
+/hotels and dashboard queries with the indexes dropped and again with them
+in place, so the switch from sequential scans to index scans is visible.
+
+Usage: python bench_indexes.py [--hotels 200000] [--database-url URL]
+Defaults to a throwaway SQLite file; the target database is wiped.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--hotels', type=int, default=200000)
+    parser.add_argument('--cities', type=int, default=50)
+    parser.add_argument('--categories', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--database-url')
+    return parser.parse_args()
+
+
+args = parse_args()
+os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'bench_indexes.db')
+
+from sqlalchemy import select, text  # noqa: E402
+from app import app, db  # noqa: E402
+from models import City, HotelCategory, Hotel  # noqa: E402
+
+
+def seed(n_hotels, n_cities, n_categories):
+    """Fill the database with a reproducible synthetic catalogue"""
+    rng = random.Random(42)
+    db.drop_all()
+    db.create_all()
+    db.session.execute(City.__table__.insert(), [{'name': f'City {i}', 'country': 'Morocco'} for i in range(n_cities)])
+    db.session.execute(HotelCategory.__table__.insert(), [{'name': f'Category {i}'} for i in range(n_categories)])
+    chunk = []
+    for i in range(n_hotels):
+        chunk.append({
+            'name': f'Hotel {i}',
+            'rating': round(rng.uniform(1, 5), 1),
+            'price_per_night': round(rng.lognormvariate(4.5, 0.6), 2),
+            'is_available': rng.random() < 0.9,
+            'city_id': rng.randint(1, n_cities),
+            'category_id': rng.randint(1, n_categories),
+        })
+        if len(chunk) == 10000:
+            db.session.execute(Hotel.__table__.insert(), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(Hotel.__table__.insert(), chunk)
+    db.session.commit()
+
+
+def benchmark_queries():
+    """The statements issued by /hotels and the admin dashboard"""
+    listing = select(Hotel).filter_by(is_available=True).order_by(Hotel.rating.desc(), Hotel.id.desc()).limit(25)
+    return {
+        'hotels (unfiltered)': listing,
+        'hotels (city)': listing.where(Hotel.city_id == 7),
+        'hotels (category)': listing.where(Hotel.category_id == 3),
+        'hotels (min rating)': listing.where(Hotel.rating >= 4.5),
+        'hotels (price range)': listing.where(Hotel.price_per_night.between(80, 90)),
+        'dashboard (recent)': select(Hotel).order_by(Hotel.created_at.desc()).limit(5),
+    }
+
+
+def explain(statement):
+    """Return the backend's query plan for a statement as text"""
+    sql = str(statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    if db.engine.dialect.name == 'sqlite':
+        rows = db.session.execute(text('EXPLAIN QUERY PLAN ' + sql)).all()
+        return '; '.join(row[-1] for row in rows)
+    rows = db.session.execute(text('EXPLAIN ' + sql)).all()
+    return ' | '.join(row[0].strip() for row in rows)
+
+
+def time_query(statement, repeat):
+    """Median wall time of a statement in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        db.session.execute(statement).all()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def report(label, repeat):
+    print(f"\n--- {label} ---")
+    for name, statement in benchmark_queries().items():
+        print(f"{name:22} {time_query(statement, repeat):8.2f} ms  {explain(statement)}")
+
+
+def main():
+    with app.app_context():
+        print(f"Seeding {args.hotels} hotels into {db.engine.url.render_as_string(hide_password=True)}...")
+        seed(args.hotels, args.cities, args.categories)
+
+        for index in Hotel.__table__.indexes:
+            index.drop(db.engine)
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+        report('without indexes', args.repeat)
+
+        for index in Hotel.__table__.indexes:
+            index.create(db.engine)
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+        report('with indexes', args.repeat)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+Request-path overhead of the logging pipeline.
+Compares three setups writing JSON lines to the same sink:
+
+- 'off': no handler (the baseline)
+- 'sync': a StreamHandler formatting and writing in the calling thread, as
+  logging.basicConfig does
+- 'queue': the QueueHandler/QueueListener pipeline from logs.py
+
+and reports the latency of a single logging call and of a cached GET /hotels
+(which logs its access record) through the Flask test client. The sink sleeps
+--sink-latency-ms per write to stand in for a slow stderr pipe or log shipper.
+
+Usage: python bench_logging.py [--calls 20000] [--requests 2000] [--sink-latency-ms 0.1]
+"""
+
+import argparse
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import tempfile
+import time
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'bench_logging.db')
+os.environ.setdefault('SESSION_SECRET', 'bench-logging')
+
+from app import create_app  # noqa: E402
+from logs import JSONFormatter, RequestContextFilter, StructuredQueueHandler  # noqa: E402
+
+
+class SlowSink:
+    """A stream whose writes take ``latency`` seconds"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.lines = 0
+
+    def write(self, text):
+        self.lines += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def flush(self):
+        pass
+
+
+def install(mode, sink):
+    """Set the root logger up for ``mode``; returns the listener to stop, if any"""
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    if mode == 'off':
+        return None
+    stream = logging.StreamHandler(sink)
+    stream.setFormatter(JSONFormatter())
+    if mode == 'sync':
+        stream.addFilter(RequestContextFilter())
+        root.addHandler(stream)
+        return None
+    handler = StructuredQueueHandler(queue.SimpleQueue())
+    handler.addFilter(RequestContextFilter())
+    root.addHandler(handler)
+    listener = logging.handlers.QueueListener(handler.queue, stream)
+    listener.start()
+    return listener
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    return {name: timings[min(len(timings) - 1, int(fraction * len(timings)))] * 1e6
+            for name, fraction in (('p50', 0.5), ('p99', 0.99), ('max', 1.0))}
+
+
+def time_calls(count):
+    logger = logging.getLogger('bench')
+    timings = []
+    for i in range(count):
+        start = time.perf_counter()
+        logger.info("Saved hotel %d", i, extra={'city': 'Fes', 'inserted': 1})
+        timings.append(time.perf_counter() - start)
+    return percentiles(timings)
+
+
+def time_requests(app, count):
+    client = app.test_client()
+    client.get('/hotels')
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        client.get('/hotels')
+        timings.append(time.perf_counter() - start)
+    return percentiles(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Logging pipeline overhead')
+    parser.add_argument('--calls', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--sink-latency-ms', type=float, default=0.1)
+    args = parser.parse_args()
+
+    app = create_app({'JOB_WORKERS': 0})
+    with app.app_context():
+        from generate_dataset import generate_dataset
+        generate_dataset(200, reset=True)
+    logging.getLogger().setLevel(logging.INFO)
+
+    print(f"Sink latency {args.sink_latency_ms} ms per line; times in microseconds\n")
+    print(f"{'':8} {'call p50':>9} {'call p99':>9} {'call max':>9} {'req p50':>9} {'req p99':>9} {'req max':>9}")
+    for mode in ('off', 'sync', 'queue'):
+        sink = SlowSink(args.sink_latency_ms / 1000)
+        listener = install(mode, sink)
+        calls = time_calls(args.calls)
+        requests = time_requests(app, args.requests)
+        if listener is not None:
+            listener.stop()
+        print(f"{mode:8} {calls['p50']:9.1f} {calls['p99']:9.1f} {calls['max']:9.1f} "
+              f"{requests['p50']:9.1f} {requests['p99']:9.1f} {requests['max']:9.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+Catalogue latency during a login storm.
+For each password hashing mode (PASSWORD_HASH_POOL) a threaded server runs in
+its own process. This process first times GET /hotels from --clients threads
+alone, then again while --logins threads post valid logins as fast as they
+can, and reports catalogue p50/p99 for both phases, completed logins per
+second, logins turned away with 503 and failed logins.
+
+Usage: python bench_login.py [--modes none,thread,process] [--seconds 10]
+                             [--clients 4] [--logins 8]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+CREDENTIALS = {'username': 'storm', 'password': 'storm-password'}
+
+
+def serve():
+    """Worker: seed a database and serve the app on a free port"""
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'bench_login.db')
+    os.environ.setdefault('SESSION_SECRET', 'bench-login')
+    os.environ.setdefault('LOG_LEVELS', 'access=WARNING')
+    from werkzeug.serving import make_server
+    from app import create_app, db
+    from generate_dataset import generate_dataset
+    from models import User
+
+    app = create_app({'WTF_CSRF_ENABLED': False, 'JOB_WORKERS': 0})
+    with app.app_context():
+        generate_dataset(500, reset=True)
+        user = User(username=CREDENTIALS['username'], email='storm@hotel.com')
+        user.set_password(CREDENTIALS['password'])
+        db.session.add(user)
+        db.session.commit()
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    print(f'PORT {server.server_port}', flush=True)
+    server.serve_forever()
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def drive(base_url, seconds, clients, logins):
+    """Catalogue latencies (seconds) and login outcome counts"""
+    stop = time.monotonic() + seconds
+    latencies, outcomes = [], {'ok': 0, 'busy': 0, 'failed': 0}
+    lock = threading.Lock()
+
+    def catalogue():
+        while time.monotonic() < stop:
+            start = time.perf_counter()
+            urllib.request.urlopen(base_url + '/hotels').read()
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    def login():
+        opener = urllib.request.build_opener(NoRedirect)
+        body = urllib.parse.urlencode(CREDENTIALS).encode()
+        while time.monotonic() < stop:
+            try:
+                opener.open(base_url + '/auth/login', body).read()
+                outcome = 'failed'  # the login form again
+            except urllib.error.HTTPError as e:
+                outcome = {302: 'ok', 503: 'busy'}.get(e.code, 'failed')
+            with lock:
+                outcomes[outcome] += 1
+
+    threads = [threading.Thread(target=catalogue) for _ in range(clients)]
+    threads += [threading.Thread(target=login) for _ in range(logins)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), outcomes
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))] * 1000
+
+
+def run_mode(mode, args):
+    env = dict(os.environ, PASSWORD_HASH_POOL=mode)
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve'], env=env,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        line = ''
+        while not line.startswith('PORT '):
+            line = server.stdout.readline()
+            if not line:
+                raise SystemExit(f"Server for {mode!r} failed to start")
+        base_url = f'http://127.0.0.1:{line.split()[1]}'
+        drive(base_url, 1, args.clients, 0)  # warm up
+        quiet, _ = drive(base_url, args.seconds, args.clients, 0)
+        storm, outcomes = drive(base_url, args.seconds, args.clients, args.logins)
+    finally:
+        server.terminate()
+        server.wait()
+    print(f"{mode:8} {percentile(quiet, 0.5):9.1f} {percentile(quiet, 0.99):9.1f} "
+          f"{percentile(storm, 0.5):9.1f} {percentile(storm, 0.99):9.1f} "
+          f"{outcomes['ok'] / args.seconds:9.1f} {outcomes['busy']:9} {outcomes['failed']:9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Catalogue latency during a login storm')
+    parser.add_argument('--modes', default='none,thread', type=lambda value: value.split(','))
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--clients', type=int, default=4, help='catalogue client threads')
+    parser.add_argument('--logins', type=int, default=8, help='login client threads')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve()
+        return 0
+
+    print(f"{os.cpu_count()} CPUs, {args.clients} catalogue clients, {args.logins} login clients; "
+          f"latencies in ms\n")
+    print(f"{'':8} {'quiet p50':>9} {'quiet p99':>9} {'storm p50':>9} {'storm p99':>9} "
+          f"{'logins/s':>9} {'rejected':>9} {'failed':>9}")
+    for mode in args.modes:
+        run_mode(mode, args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Throughput benchmark for the search results parsers.
+Parses a corpus of saved results pages with the original extraction path
+(whole page through html.parser, inline re.compile lookups) and with each
+backend in hotel_parsers.py, and reports cards per second. Every backend's
+output is checked against the original.
+
+Usage: python bench_parser.py [--corpus DIR] [--repeat 3]
+Without --corpus a generated corpus (see fixture_server.py) is used.
+"""
+
+import argparse
+import glob
+import os
+import re
+import sys
+import tempfile
+import time
+from bs4 import BeautifulSoup
+from fixture_server import save_corpus
+from hotel_parsers import PARSERS, get_parser, lxml
+
+
+def legacy_extract(content):
+    """The extraction path BookingScraper used before hotel_parsers.py"""
+    soup = BeautifulSoup(content, 'html.parser')
+    cards = soup.find_all('div', {'data-testid': 'property-card'})
+    if not cards:
+        cards = soup.find_all('div', class_=re.compile('sr_item'))
+    results = []
+    for card in cards:
+        name = card.find('h3') or card.find('h2') or card.find('a', {'data-testid': 'title-link'})
+        address = card.find('span', {'data-testid': 'address'}) or card.find('span', class_=re.compile('address'))
+        price = card.find('span', {'data-testid': 'price-and-discounted-price'}) or card.find('div', class_=re.compile('price'))
+        rating = card.find('div', {'data-testid': 'review-score'}) or card.find('div', class_=re.compile('rating'))
+        review = card.find('div', {'data-testid': 'review-score-word'}) or card.find('span', class_=re.compile('review'))
+        desc = card.find('div', class_=re.compile('important_facility')) or card.find('div', class_=re.compile('facility'))
+        img = card.find('img')
+        results.append({
+            'name': name.get_text(strip=True) if name else None,
+            'address': address.get_text(strip=True) if address else None,
+            'price': price.get_text(strip=True) if price else None,
+            'rating': rating.get_text(strip=True) if rating else None,
+            'review': review.get_text(strip=True) if review else None,
+            'description': desc.get_text(strip=True) if desc else None,
+            'image_url': (img.get('src') or img.get('data-src')) if img else None,
+        })
+    return results
+
+
+def backend_extract(parser):
+    def extract(content):
+        return [parser.fields(card) for card in parser.cards(content)]
+    return extract
+
+
+def run(extract, pages, repeat):
+    """Best-of-``repeat`` cards per second, and the extracted records"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        records = [record for content in pages for record in extract(content)]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(records) / best, records
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Results page parser throughput')
+    parser.add_argument('--corpus', help='directory of saved .html results pages')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = args.corpus
+    if corpus is None:
+        corpus = os.path.join(tempfile.gettempdir(), 'bench_parser_corpus')
+        save_corpus(corpus)
+    pages = []
+    for path in sorted(glob.glob(os.path.join(corpus, '*.html'))):
+        with open(path, 'rb') as f:
+            pages.append(f.read())
+    print(f"Corpus: {len(pages)} pages from {corpus}")
+
+    baseline, expected = run(legacy_extract, pages, args.repeat)
+    print(f"{'original (html.parser)':24} {baseline:10.0f} cards/s")
+    for name in PARSERS:
+        if lxml is None and name != 'soup':
+            print(f"{name:24} skipped (lxml not installed)")
+            continue
+        rate, records = run(backend_extract(get_parser(name)), pages, args.repeat)
+        status = 'ok' if records == expected else 'OUTPUT DIFFERS'
+        print(f"{name:24} {rate:10.0f} cards/s  x{rate / baseline:.1f}  {status}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
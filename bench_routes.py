@@ -0,0 +1,269 @@
+"""
+Route latency benchmark.
+Seeds a database with generate_dataset.py at each requested size, then drives
+the public and admin routes and the login flow through the Flask test client
+and reports p50/p95/p99 latency, queries per request, mean time in SQL and
+templates (from the Server-Timing header) and the peak RSS of the process.
+Every (backend, size) pair runs in its own subprocess so RSS and caches start
+fresh. Anonymous pages are measured with the page cache off unless
+--page-cache is given, and each route stops after --route-seconds. SQLite
+always runs; PostgreSQL runs when --postgres-url (or BENCH_POSTGRES_URL)
+points at a reachable server. Target databases are wiped.
+
+Results are written as JSON; pass an earlier file to --compare to print the
+p95 change per route.
+
+Usage: python bench_routes.py [--sizes 1000,10000,100000] [--requests 200]
+                              [--output bench_routes.json] [--compare OLD.json]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# (name, URL, log in as admin first)
+SCENARIOS = [
+    ('index', '/', False),
+    ('hotels', '/hotels', False),
+    ('hotels page 2', '/hotels?after={cursor}', False),
+    ('hotels city', '/hotels?city_id=1', False),
+    ('hotels category+price', '/hotels?category_id=2&min_price=50&max_price=150', False),
+    ('hotels city+category+rating', '/hotels?city_id=3&category_id=1&min_rating=4', False),
+    ('hotels search', '/hotels?search=riad', False),
+    ('admin dashboard', '/admin', True),
+    ('admin hotels', '/admin/hotels', True),
+]
+LOGIN_SCENARIO = 'login'
+ADMIN_CREDENTIALS = {'username': 'admin', 'password': 'admin123'}
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list"""
+    index = max(0, min(len(values) - 1, round(fraction * len(values) + 0.5) - 1))
+    return values[index]
+
+
+def server_timing(response):
+    """Durations by metric name from a response's Server-Timing header(s)"""
+    durations = {}
+    for header in response.headers.getlist('Server-Timing'):
+        for metric in header.split(','):
+            name, *params = metric.strip().split(';')
+            for param in params:
+                if param.startswith('dur='):
+                    durations[name] = durations.get(name, 0.0) + float(param[4:])
+    return durations
+
+
+def summarize(timings, queries, phases):
+    timings = sorted(timings)
+    return {
+        'db_ms': round(sum(phase.get('db', 0.0) for phase in phases) / len(phases), 3),
+        'template_ms': round(sum(phase.get('tpl', 0.0) for phase in phases) / len(phases), 3),
+        'p50_ms': round(percentile(timings, 0.50), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'queries': max(queries),
+        'requests': len(timings),
+    }
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_worker(args):
+    """Seed one database and time every scenario; writes results to args.output"""
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('SESSION_SECRET', 'bench-routes')
+
+    from flask import g, request_finished
+    from werkzeug.datastructures import MultiDict
+    from app import create_app, db
+
+    config = {'WTF_CSRF_ENABLED': False, 'SQL_INSTRUMENTATION': True, 'JOB_WORKERS': 0}
+    if not args.page_cache:
+        config['PAGE_CACHE_BACKEND'] = 'none'
+    app = create_app(config)
+
+    from generate_dataset import generate_dataset
+    from models import User, Hotel
+    from search import hotel_search_params, search_page
+
+    with app.app_context():
+        generate_dataset(args.size, reset=True)
+        admin = User(username=ADMIN_CREDENTIALS['username'], email='admin@hotel.com', is_admin=True)
+        admin.set_password(ADMIN_CREDENTIALS['password'])
+        db.session.add(admin)
+        db.session.commit()
+        first_page = search_page(Hotel.with_relations(), hotel_search_params(MultiDict()), None, None,
+                                 app.config['HOTELS_PER_PAGE'])
+        cursor = first_page.next_cursor or ''
+
+    query_counts = []
+
+    def record(sender, response, **extra):
+        query_counts.append(g.get('query_count', 0))
+
+    request_finished.connect(record, app)
+
+    def measure(name, send):
+        timings, queries, phases = [], [], []
+        deadline = time.perf_counter() + args.route_seconds
+        for i in range(args.warmup + args.requests):
+            if len(timings) >= 5 and time.perf_counter() > deadline:
+                break
+            del query_counts[:]
+            start = time.perf_counter()
+            response = send()
+            elapsed = (time.perf_counter() - start) * 1000
+            if not 200 <= response.status_code < 300:
+                raise SystemExit(f"Scenario {name!r} got HTTP {response.status_code}")
+            if i >= args.warmup:
+                timings.append(elapsed)
+                queries.append(sum(query_counts))
+                phases.append(server_timing(response))
+        return summarize(timings, queries, phases)
+
+    results = {}
+    for name, url, as_admin in SCENARIOS:
+        client = app.test_client()
+        if as_admin:
+            client.post('/auth/login', data=ADMIN_CREDENTIALS)
+        url = url.format(cursor=cursor)
+        results[name] = measure(name, lambda: client.get(url))
+
+    # A fresh session logging in and landing on the dashboard
+    results[LOGIN_SCENARIO] = measure(
+        LOGIN_SCENARIO, lambda: app.test_client().post('/auth/login', data=ADMIN_CREDENTIALS, follow_redirects=True))
+
+    with open(args.output, 'w') as f:
+        json.dump({'routes': results, 'peak_rss_mb': peak_rss_mb()}, f)
+
+
+def postgres_available(url):
+    if not url:
+        return False
+    from sqlalchemy import create_engine
+    try:
+        with create_engine(url).connect():
+            return True
+    except Exception as e:
+        print(f"Skipping PostgreSQL ({e.__class__.__name__}: {e})")
+        return False
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(args):
+    backends = [('sqlite', None)]
+    if postgres_available(args.postgres_url):
+        backends.append(('postgresql', args.postgres_url))
+
+    results = []
+    for backend, url in backends:
+        for size in args.sizes:
+            database_url = url or 'sqlite:///' + os.path.join(tempfile.gettempdir(), f'bench_routes_{size}.db')
+            with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+                output = f.name
+            print(f"{backend}, {size} hotels...", flush=True)
+            command = [sys.executable, os.path.abspath(__file__), '--worker',
+                       '--database-url', database_url, '--size', str(size), '--output', output,
+                       '--requests', str(args.requests), '--warmup', str(args.warmup),
+                       '--route-seconds', str(args.route_seconds)]
+            if args.page_cache:
+                command.append('--page-cache')
+            process = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+            if process.returncode:
+                print(process.stderr[-3000:])
+                raise SystemExit(f"Benchmark failed for {backend}, {size} hotels")
+            with open(output) as f:
+                worker = json.load(f)
+            os.remove(output)
+            for route, stats in worker['routes'].items():
+                results.append(dict(stats, backend=backend, size=size, route=route,
+                                    peak_rss_mb=worker['peak_rss_mb']))
+    return results
+
+
+def print_results(results, previous=None):
+    baseline = {}
+    if previous:
+        baseline = {(r['backend'], r['size'], r['route']): r for r in previous['results']}
+    print(f"\n{'backend':10} {'size':>8} {'route':28} {'p50':>8} {'p95':>8} {'p99':>8} "
+          f"{'db':>7} {'tpl':>7} {'queries':>7} {'rss MB':>7}")
+    for r in results:
+        line = (f"{r['backend']:10} {r['size']:>8} {r['route']:28} {r['p50_ms']:8.2f} {r['p95_ms']:8.2f} "
+                f"{r['p99_ms']:8.2f} {r['db_ms']:7.2f} {r['template_ms']:7.2f} {r['queries']:>7} {r['peak_rss_mb']:>7}")
+        old = baseline.get((r['backend'], r['size'], r['route']))
+        if old:
+            change = (r['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0.0
+            line += f"  p95 {change:+.0f}%"
+            if r['queries'] != old['queries']:
+                line += f"  queries {old['queries']} -> {r['queries']}"
+        print(line)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Route latency benchmark')
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        type=lambda value: [int(size) for size in value.split(',')])
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per route')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--postgres-url', default=os.environ.get('BENCH_POSTGRES_URL'))
+    parser.add_argument('--route-seconds', type=float, default=20.0,
+                        help='stop timing a route after this long (at least 5 requests)')
+    parser.add_argument('--page-cache', action='store_true', help='serve anonymous pages from the page cache')
+    parser.add_argument('--output', default='bench_routes.json')
+    parser.add_argument('--compare', metavar='OLD_JSON', help='print p95 changes against an earlier run')
+    # Internal: run one (database, size) pair
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--database-url', help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.worker:
+        run_worker(args)
+        return 0
+
+    results = run_suite(args)
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.utcnow().isoformat(),
+        'python': sys.version.split()[0],
+        'requests': args.requests,
+        'page_cache': args.page_cache,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_results(results, previous)
+    print(f"\nSaved to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
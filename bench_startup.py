@@ -0,0 +1,128 @@
+"""
+Startup time benchmark.
+Starts a fresh interpreter per run and measures how long `import app` and
+`import main` (what a gunicorn worker does to boot) take, the wall time of
+the whole process, the number of modules loaded and whether heavy scraper
+dependencies (BeautifulSoup, requests, lxml) were pulled in. One extra run
+counts the SQL statements issued while booting and during the --settle
+seconds after it, so background threads started at boot are caught too.
+
+--path benchmarks another checkout, e.g. a `git worktree` of an older commit,
+so the two can be compared with --compare.
+
+Usage: python bench_startup.py [--runs 20] [--database-url URL] [--path DIR]
+                               [--output bench_startup.json] [--compare OLD.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HEAVY_MODULES = ('bs4', 'requests', 'lxml')
+
+PROBE = """
+import json, sys, time
+if sys.argv[1] == 'statements':
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    statements = []
+    event.listen(Engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+import main
+booted = time.perf_counter()
+if sys.argv[1] == 'statements':
+    time.sleep(float(sys.argv[2]))
+print(json.dumps({
+    'import_app_ms': (imported - started) * 1000,
+    'boot_ms': (booted - started) * 1000,
+    'modules': len(sys.modules),
+    'heavy_modules': sorted(name for name in %r if name in sys.modules),
+    'statements': len(statements) if sys.argv[1] == 'statements' else None,
+}))
+""" % (HEAVY_MODULES,)
+
+
+def probe(args, mode='time'):
+    env = dict(os.environ, DATABASE_URL=args.database_url, SESSION_SECRET='bench-startup')
+    started = time.perf_counter()
+    process = subprocess.run([sys.executable, '-c', PROBE, mode, str(args.settle)], cwd=args.path, env=env,
+                             capture_output=True, text=True)
+    elapsed = (time.perf_counter() - started) * 1000
+    if process.returncode:
+        print(process.stderr[-3000:])
+        raise SystemExit("Startup probe failed")
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    result['process_ms'] = elapsed
+    return result
+
+
+def run(args):
+    # Warm the bytecode cache and let an old checkout create its tables on import
+    probe(args)
+    runs = [probe(args) for _ in range(args.runs)]
+    report = {'runs': args.runs, 'path': os.path.abspath(args.path)}
+    for key in ('import_app_ms', 'boot_ms', 'process_ms'):
+        values = sorted(run[key] for run in runs)
+        report[key] = {'median': round(statistics.median(values), 1),
+                       'min': round(values[0], 1), 'max': round(values[-1], 1)}
+    report['modules'] = runs[-1]['modules']
+    report['heavy_modules'] = runs[-1]['heavy_modules']
+    report['statements'] = probe(args, 'statements')['statements']
+    report['settle'] = args.settle
+    return report
+
+
+def print_report(report, previous=None):
+    print(f"\n{'metric':16} {'median':>9} {'min':>9} {'max':>9}")
+    for key, label in (('import_app_ms', 'import app'), ('boot_ms', 'import main'), ('process_ms', 'process')):
+        stats = report[key]
+        line = f"{label:16} {stats['median']:9.1f} {stats['min']:9.1f} {stats['max']:9.1f}"
+        if previous:
+            old = previous[key]['median']
+            line += f"  was {old:.1f} ({(stats['median'] - old) / old * 100:+.0f}%)"
+        print(line)
+    print(f"\nModules loaded: {report['modules']}"
+          + (f" (was {previous['modules']})" if previous else ''))
+    print(f"SQL statements at boot (+{report.get('settle', 0):g}s): {report['statements']}"
+          + (f" (was {previous['statements']})" if previous else ''))
+    print(f"Heavy modules at boot: {', '.join(report['heavy_modules']) or 'none'}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Startup time benchmark')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL') or
+                        'sqlite:///' + os.path.join(tempfile.gettempdir(), 'bench_startup.db'))
+    parser.add_argument('--path', default=os.path.dirname(os.path.abspath(__file__)),
+                        help='checkout to benchmark (default: this one)')
+    parser.add_argument('--settle', type=float, default=3.0,
+                        help='seconds to keep counting SQL statements after boot')
+    parser.add_argument('--output', default='bench_startup.json')
+    parser.add_argument('--compare', metavar='OLD_JSON', help='print changes against an earlier run')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    report = run(args)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_report(report, previous)
+    print(f"\nSaved to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,219 @@
+"""
+Caching helpers.
+TTLCache holds arbitrary values per worker. LRUCache and FileSystemCache
+hold byte strings under a total size limit and share a get/set/clear/stats
+interface, so callers can switch between a per-worker and a shared
+(directory-backed) cache by configuration.
+"""
+
+import hashlib
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe per-worker cache whose entries expire after a number of seconds"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> (expires_at, value)
+
+    def get(self, key, default=None):
+        """Return the cached value for ``key`` or ``default`` if missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return default
+        return entry[1]
+
+    def set(self, key, value, ttl):
+        """Cache ``value`` under ``key`` for ``ttl`` seconds"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+
+    def get_or_set(self, key, factory, ttl):
+        """Return the cached value for ``key``, computing it with ``factory`` on a miss"""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = factory()
+            self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, key=None):
+        """Drop one entry, or every entry when ``key`` is None"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+class LRUCache:
+    """Thread-safe per-worker cache of byte strings, evicting least recently used entries past ``max_bytes``"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._size = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        """Return the cached bytes for ``key`` or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        """Cache ``value`` (bytes) under ``key`` for ``ttl`` seconds"""
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[1])
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(self._entries), 'bytes': self._size}
+
+
+class FileSystemCache:
+    """Cache of byte strings in a directory shared by all workers on a host.
+
+    Each entry is one file named after the hash of its key; reads refresh the
+    file's mtime so eviction past ``max_bytes`` drops the least recently used.
+    Writes keep a running estimate of the directory's size instead of listing
+    it each time; the directory is scanned only when the estimate passes
+    ``max_bytes`` or every SCAN_EVERY writes, which also picks up what other
+    workers wrote. Eviction then goes down to LOW_WATER of the cap so the next
+    writes do not scan again at once. Hit/miss counters are per worker.
+    """
+
+    HEADER = struct.Struct('!d')  # expiry as a Unix timestamp
+    SCAN_EVERY = 100
+    LOW_WATER = 0.9
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = self.misses = self.evictions = 0
+        self._lock = threading.Lock()
+        self._estimate = None  # bytes in the directory; None until the first scan
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        """Return the cached bytes for ``key`` or None"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            (expires_at,) = self.HEADER.unpack_from(data)
+        except (OSError, struct.error):
+            self.misses += 1
+            return None
+        if expires_at <= time.time():
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return data[self.HEADER.size:]
+
+    def set(self, key, value, ttl):
+        """Cache ``value`` (bytes) under ``key`` for ``ttl`` seconds"""
+        if len(value) > self.max_bytes:
+            return
+        path = self._path(key)
+        try:
+            replaced = os.stat(path).st_size
+        except OSError:
+            replaced = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self.HEADER.pack(time.time() + ttl))
+            f.write(value)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._writes += 1
+            if self._estimate is not None:
+                self._estimate += self.HEADER.size + len(value) - replaced
+            scan = (self._estimate is None or self._estimate > self.max_bytes
+                    or self._writes >= self.SCAN_EVERY)
+            if scan:
+                self._writes = 0
+        if scan:
+            total = self._evict()
+            with self._lock:
+                self._estimate = total
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith('.tmp'):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        """Scan the directory, evict down to LOW_WATER if over the cap; returns the bytes left"""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return total
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes * self.LOW_WATER:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+        return total
+
+    def clear(self):
+        """Drop every entry"""
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._lock:
+            self._estimate = None
+
+    def stats(self):
+        entries = self._entries()
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(entries), 'bytes': sum(size for _, size, _ in entries)}
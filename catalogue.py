@@ -0,0 +1,78 @@
+"""
+Catalogue data version and conditional GET support.
+Every write to hotels, cities or categories bumps the 'catalogue' DataVersion.
+Public catalogue pages derive their ETag and Last-Modified from it, so a
+repeat visitor whose copy is still current gets a 304 before any catalogue
+query or template rendering runs.
+"""
+
+import hashlib
+import threading
+import time
+from functools import wraps
+from flask import make_response, request, session
+from flask_login import current_user
+from app import app, db
+from models import DataVersion
+
+app.config.setdefault("ETAG_SALT", "")  # change on deploy when templates change
+
+CATALOGUE_VERSION = 'catalogue'
+
+_lock = threading.Lock()
+_state = {'version': None, 'updated_at': None, 'checked_at': 0.0}
+
+
+def catalogue_version():
+    """(version, updated_at) of the catalogue, re-read at most every DATA_VERSION_CHECK_INTERVAL"""
+    now = time.monotonic()
+    if _state['version'] is None or now - _state['checked_at'] >= app.config['DATA_VERSION_CHECK_INTERVAL']:
+        row = db.session.query(DataVersion.version, DataVersion.updated_at).filter_by(name=CATALOGUE_VERSION).first()
+        with _lock:
+            _state['version'], _state['updated_at'] = row if row else (0, None)
+            _state['checked_at'] = now
+    return _state['version'], _state['updated_at']
+
+
+def bump_catalogue_version(commit=True):
+    """Record that hotels, cities or categories changed"""
+    DataVersion.bump(CATALOGUE_VERSION)
+    if commit:
+        db.session.commit()
+    with _lock:
+        _state['version'] = None
+
+
+def catalogue_etag(version):
+    """ETag for the current request's page at a catalogue version"""
+    key = f"{app.config['ETAG_SALT']}:{version}:{request.endpoint}:{request.query_string.decode()}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def conditional_get(f):
+    """Decorator answering anonymous catalogue requests with 304 when unchanged"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        # Logged-in pages and pending flash messages change the rendered HTML
+        if current_user.is_authenticated or session.get('_flashes'):
+            return f(*args, **kwargs)
+
+        version, updated_at = catalogue_version()
+        etag = catalogue_etag(version)
+        if updated_at is not None:
+            updated_at = updated_at.replace(microsecond=0)
+
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains(etag)
+        else:
+            not_modified = (updated_at is not None and request.if_modified_since is not None
+                            and updated_at <= request.if_modified_since.replace(tzinfo=None))
+
+        response = make_response('', 304) if not_modified else make_response(f(*args, **kwargs))
+        response.set_etag(etag)
+        if updated_at is not None:
+            response.last_modified = updated_at
+        response.headers['Cache-Control'] = 'no-cache'
+        response.vary.add('Cookie')
+        return response
+    return decorated_function
@@ -0,0 +1,109 @@
+"""
+Query budget check for the hotel listing routes.
+Seeds a throwaway SQLite database at two catalogue sizes and requests every
+listing route in strict budget mode. Exits non-zero if a route goes over its
+@query_budget or if its query count changes with the number of hotels, which
+means something is lazily loading per row.
+
+Usage: python check_query_budget.py
+"""
+
+import os
+import sys
+import tempfile
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'check_query_budget.db')
+os.environ.setdefault('SESSION_SECRET', 'check-query-budget')
+
+from flask import g, request_finished  # noqa: E402
+from app import app, db  # noqa: E402
+import routes  # noqa: E402, F401
+from models import User, City, HotelCategory, Hotel  # noqa: E402
+from search import memory_index  # noqa: E402
+from stats import invalidate_dashboard_stats  # noqa: E402
+from reference import invalidate_reference_data  # noqa: E402
+from user_cache import clear_user_cache  # noqa: E402
+
+SIZES = (10, 300)
+
+# (description, URL, log in as admin first)
+CHECKS = [
+    ('index', '/', False),
+    ('hotels', '/hotels', False),
+    ('hotels filtered', '/hotels?city_id=1&category_id=2&min_price=10&min_rating=2', False),
+    ('hotels search', '/hotels?search=riad', False),
+    ('admin dashboard', '/admin', True),
+    ('admin hotels', '/admin/hotels', True),
+]
+
+
+def seed(n_hotels):
+    db.drop_all()
+    db.create_all()
+    admin = User(username='admin', email='admin@hotel.com', is_admin=True)
+    admin.set_password('admin123')
+    db.session.add(admin)
+    cities = [City(name=f'City {i}') for i in range(5)]
+    categories = [HotelCategory(name=f'Category {i}') for i in range(4)]
+    db.session.add_all(cities + categories)
+    db.session.flush()
+    for i in range(n_hotels):
+        db.session.add(Hotel(
+            name=f'Riad {i}',
+            rating=(i % 50) / 10,
+            price_per_night=20 + i % 200,
+            city_id=cities[i % len(cities)].id,
+            category_id=categories[i % len(categories)].id,
+        ))
+    db.session.commit()
+
+
+def reset_caches():
+    """Start every request cold so counts are the worst case and comparable"""
+    with app.app_context():
+        memory_index.invalidate()
+        invalidate_dashboard_stats()
+        invalidate_reference_data()
+        clear_user_cache()
+
+
+def run_checks():
+    counts = {}
+
+    def record(sender, response, **extra):
+        counts['last'] = g.get('query_count', 0)
+
+    request_finished.connect(record, app)
+    for size in SIZES:
+        with app.app_context():
+            seed(size)
+        for description, url, as_admin in CHECKS:
+            client = app.test_client()
+            if as_admin:
+                client.post('/auth/login', data={'username': 'admin', 'password': 'admin123'})
+            reset_caches()
+            response = client.get(url)
+            if response.status_code != 200:
+                raise SystemExit(f'{description}: HTTP {response.status_code} at {size} hotels')
+            counts[(description, size)] = counts['last']
+    return counts
+
+
+def main():
+    app.config['QUERY_BUDGET_STRICT'] = True
+    app.config['PROPAGATE_EXCEPTIONS'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['PAGE_CACHE_BACKEND'] = 'none'
+    counts = run_checks()
+
+    failed = False
+    for description, _, _ in CHECKS:
+        per_size = [counts[(description, size)] for size in SIZES]
+        status = 'ok' if len(set(per_size)) == 1 else 'FAIL (grows with row count)'
+        failed = failed or status != 'ok'
+        print(f"{description:18} queries {per_size}  {status}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
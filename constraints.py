@@ -0,0 +1,44 @@
+"""
+Write helpers that let the database enforce uniqueness and references.
+Views insert or update straight away and catch IntegrityError instead of
+looking for duplicates first, so a successful write costs no extra SELECTs;
+taken_values() then explains a failure in one query. delete_unreferenced()
+guards a delete with NOT EXISTS inside the DELETE itself, so its cost does
+not depend on how many rows point at the one being deleted.
+"""
+
+from sqlalchemy import delete, exists, select
+from app import db
+
+
+def taken_values(model, exclude_id=None, **values):
+    """Names of ``values`` another ``model`` row already has, in one query.
+
+    Call after a failed write was rolled back; ``exclude_id`` skips the row
+    being edited.
+    """
+    checks = []
+    for name, value in values.items():
+        clause = exists().where(getattr(model, name) == value)
+        if exclude_id is not None:
+            clause = clause.where(model.id != exclude_id)
+        checks.append(clause.label(name))
+    row = db.session.execute(select(*checks)).one()
+    return [name for name in values if row._mapping[name]]
+
+
+def delete_unreferenced(model, row_id, foreign_key):
+    """Delete ``model`` row ``row_id`` unless ``foreign_key`` rows reference it.
+
+    Returns True if it was deleted (the caller commits), False if it is still
+    referenced and None if there is no such row.
+    """
+    result = db.session.execute(
+        delete(model)
+        .where(model.id == row_id, ~exists().where(foreign_key == row_id))
+        .execution_options(synchronize_session=False))
+    if result.rowcount:
+        return True
+    if db.session.query(exists().where(model.id == row_id)).scalar():
+        return False
+    return None
@@ -0,0 +1,149 @@
+"""
+Local stand-in for the Booking.com search results page.
+Serves generated result pages with the markup BookingScraper parses, so the
+scraping engine can be exercised and timed without touching the network:
+
+    python fixture_server.py --port 8765 --cards 25 --latency 0.2
+    BookingScraper(search_url="http://127.0.0.1:8765/searchresults.html")
+
+With --save DIR it writes a corpus of pages to DIR instead of serving them.
+"""
+
+import argparse
+import hashlib
+import html
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+AMENITIES = ['Free WiFi', 'Pool', 'Spa', 'Hammam', 'Rooftop terrace', 'Parking',
+             'Airport shuttle', 'Restaurant', 'Fitness centre', 'Garden']
+REVIEW_WORDS = ['Exceptional', 'Wonderful', 'Very good', 'Good', 'Pleasant']
+NAME_PARTS = ['Riad', 'Dar', 'Hotel', 'Palais', 'Kasbah', 'Maison', 'Villa']
+NAME_WORDS = ['Yasmine', 'Atlas', 'Medina', 'Andalous', 'Zitoun', 'Salam', 'Nour',
+              'Bahia', 'Majorelle', 'Layla', 'Amira', 'Sahara', 'Oasis']
+
+CARD_TEMPLATE = """
+<div data-testid="property-card" class="c82435a4b8 a178069f51 a6ae3c2b40">
+  <div class="c90a25d457"><a href="/hotel/ma/{slug}.html"><img src="https://cf.bstatic.com/images/{slug}.jpg" alt="{name}" width="200"></a></div>
+  <div class="c1edfbabcb">
+    <div class="dd023375f5"><h3 class="a4225678b2"><a data-testid="title-link" href="/hotel/ma/{slug}.html"><div data-testid="title" class="fcab3ed991">{name}</div></a></h3></div>
+    <div class="a1b3f50dcd"><span data-testid="address" class="f4bd0794db">{address}</span><span data-testid="distance">{distance} km from centre</span></div>
+    <div class="d22a7c133b"><div class="important_facility_list">{amenities}</div></div>
+    <div data-testid="review-score" class="a3b8729ab1"><div class="a3b8729ab1 d86cee9b25">{score}</div><div data-testid="review-score-word" class="a3b8729ab1 e6208ee469">{word}</div><div class="abf093bdfe">{reviews} reviews</div></div>
+    <div data-testid="availability-rate-information"><span data-testid="price-and-discounted-price" class="f6431b446c">MAD&nbsp;{price}</span><div data-testid="taxes-and-charges">+MAD {taxes} taxes and charges</div></div>
+  </div>
+</div>
+"""
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html><head><title>Hotels in {city}</title>
+<script>window.__state = {{"page": "searchresults", "padding": "{padding}"}};</script>
+<style>.c82435a4b8 {{ display: flex; }}</style></head>
+<body>
+<header><nav>{nav}</nav></header>
+<div id="search_results_table"><div data-results-container="1">
+{cards}
+</div></div>
+<footer>{nav}</footer>
+</body></html>
+"""
+
+
+def render_results_page(city, cards=25, seed=0):
+    """HTML of one search results page for ``city`` with ``cards`` property cards"""
+    rng = random.Random(f'{city}:{seed}')
+    rendered = []
+    for i in range(cards):
+        name = f"{rng.choice(NAME_PARTS)} {rng.choice(NAME_WORDS)} {city} {seed * cards + i}"
+        rendered.append(CARD_TEMPLATE.format(
+            slug=name.lower().replace(' ', '-'),
+            name=html.escape(name),
+            address=html.escape(f"{rng.randint(1, 200)} Derb {rng.choice(NAME_WORDS)}, {city}"),
+            distance=round(rng.uniform(0.2, 12), 1),
+            amenities=' · '.join(rng.sample(AMENITIES, 3)),
+            score=round(rng.uniform(6, 9.8), 1),
+            word=rng.choice(REVIEW_WORDS),
+            reviews=rng.randint(3, 4000),
+            price=f"{rng.randint(250, 6000):,}",
+            taxes=rng.randint(10, 200),
+        ))
+    nav = ''.join(f'<a href="/{i}">Link {i}</a>' for i in range(200))
+    return PAGE_TEMPLATE.format(city=html.escape(city), cards=''.join(rendered),
+                                nav=nav, padding='x' * 20000)
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Answers any GET with a results page for the city in the ``ss`` parameter (ETag-validated)"""
+
+    cards = 25
+    latency = 0.0
+    requests_served = 0
+    _count_lock = threading.Lock()
+
+    def do_GET(self):
+        with self._count_lock:
+            FixtureHandler.requests_served += 1
+        query = parse_qs(urlsplit(self.path).query)
+        city = query.get('ss', ['Marrakech'])[0].split(',')[0]
+        offset = int(query.get('offset', ['0'])[0])
+        if self.latency:
+            time.sleep(self.latency)
+        body = render_results_page(city, self.cards, seed=offset).encode()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=0, cards=25, latency=0.0):
+    """Start the fixture server on a background thread; returns the server (see server_address)"""
+    handler = type('Handler', (FixtureHandler,), {'cards': cards, 'latency': latency})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def save_corpus(directory, pages=40, cards=25):
+    """Write ``pages`` results pages to ``directory`` for offline benchmarks"""
+    os.makedirs(directory, exist_ok=True)
+    cities = ['Marrakech', 'Fès', 'Casablanca', 'Rabat', 'Tangier', 'Agadir', 'Essaouira', 'Chefchaouen']
+    for i in range(pages):
+        city = cities[i % len(cities)]
+        with open(os.path.join(directory, f'{i:03d}-{city}.html'), 'w', encoding='utf-8') as f:
+            f.write(render_results_page(city, cards, seed=i))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for Booking.com search results')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--cards', type=int, default=25)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to wait before answering')
+    parser.add_argument('--save', metavar='DIR', help='write a corpus of pages to DIR and exit')
+    parser.add_argument('--pages', type=int, default=40)
+    args = parser.parse_args()
+
+    if args.save:
+        save_corpus(args.save, args.pages, args.cards)
+        print(f"Wrote {args.pages} pages to {args.save}")
+    else:
+        server = serve(args.port, args.cards, args.latency)
+        print(f"Serving fixture pages on http://127.0.0.1:{server.server_address[1]}/searchresults.html")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
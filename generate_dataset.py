@@ -0,0 +1,294 @@
+"""
+Synthetic dataset generator for load testing.
+Fills the database named by DATABASE_URL with a reproducible catalogue of
+any size: cities and categories with skewed (Zipf-like) popularity, prices
+drawn per category from a log-normal distribution, ratings clustered around
+4, and amenities that get richer as prices rise. Rows are inserted in chunks
+with executemany, or with COPY on PostgreSQL (psycopg2 or psycopg 3).
+
+Usage:
+    python generate_dataset.py --hotels 1000000 [--cities 40] [--categories 12]
+                               [--users 1000] [--seed 42] [--chunk-size 20000] [--reset]
+
+--reset drops and recreates every table first, and loads the hotels before
+building their indexes, which is much faster for large runs. Without it the
+rows are appended to the existing data. On PostgreSQL the full-text search
+function and indexes are (re)created after the load either way. Synthetic users all share the
+password 'password' (hashed once).
+"""
+
+import argparse
+import csv
+import io
+import itertools
+import math
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from app import app, db
+from models import User, City, HotelCategory, Hotel
+from migrate import create_missing_indexes, create_search_indexes
+from passwords import hash_password
+from reference import invalidate_reference_data
+
+# Most visited first; popularity falls off with rank
+CITY_NAMES = [
+    'Marrakech', 'Casablanca', 'Agadir', 'Fès', 'Tangier', 'Rabat', 'Essaouira',
+    'Chefchaouen', 'Ouarzazate', 'Meknes', 'Tetouan', 'Merzouga', 'El Jadida',
+    'Ifrane', 'Dakhla', 'Asilah', 'Taroudant', 'Oujda', 'Al Hoceima', 'Safi',
+    'Nador', 'Kenitra', 'Tiznit', 'Azrou', 'Zagora', 'Mohammedia', 'Larache',
+    'Beni Mellal', 'Errachidia', 'Tinghir',
+]
+
+# name, description, price multiplier, popularity weight
+CATEGORIES = [
+    ('Riad', 'Traditional Moroccan houses converted into hotels', 1.1, 20),
+    ('Budget Hotel', 'Affordable accommodations with basic amenities', 0.5, 15),
+    ('Boutique Hotel', 'Small, stylish hotels with personalized service', 1.6, 10),
+    ('Business Hotel', 'Hotels catering to business travelers with meeting facilities', 1.3, 10),
+    ('Guesthouse', 'Family-run guesthouses', 0.6, 10),
+    ('Apartment', 'Self-catering apartments', 0.8, 8),
+    ('Luxury Resort', 'High-end resorts with premium amenities and services', 3.0, 6),
+    ('Beach Resort', 'Hotels located on or near beaches with water activities', 2.0, 6),
+    ('Kasbah', 'Fortified earthen hotels in the south', 1.2, 5),
+    ('Hostel', 'Shared dormitories and private rooms', 0.25, 5),
+    ('Desert Camp', 'Tented camps in the Sahara', 0.9, 3),
+    ('Heritage Hotel', 'Historic buildings converted into unique accommodations', 1.8, 2),
+]
+
+# Amenities from most to least common; pricier hotels list more of them
+AMENITIES = [
+    'WiFi', 'Air Conditioning', 'Breakfast', 'Restaurant', 'Rooftop Terrace',
+    'Parking', 'Airport Shuttle', 'Pool', 'Bar', 'Hammam', 'Spa', 'Garden',
+    'Fitness Center', 'Room Service', 'Meeting Rooms', 'Ocean View', 'Kids Club',
+    'Tennis Court', 'Golf Course', 'Private Beach',
+]
+
+NAME_PREFIXES = ['Riad', 'Dar', 'Hotel', 'Palais', 'Kasbah', 'Maison', 'Villa', 'Auberge', 'Résidence']
+NAME_WORDS = ['Yasmine', 'Atlas', 'Medina', 'Andalous', 'Zitoun', 'Salam', 'Nour', 'Bahia',
+              'Majorelle', 'Layla', 'Amira', 'Sahara', 'Oasis', 'Argan', 'Safran', 'Zellige',
+              'Menara', 'Koutoubia', 'Tafilalt', 'Mogador', 'Anfa', 'Saadi', 'Zahra', 'Rif']
+STREETS = ['Derb', 'Rue', 'Avenue', 'Boulevard', 'Place']
+
+MEDIAN_PRICE = 110.0
+
+
+def zipf_weights(n, exponent=1.1):
+    return [1 / (rank ** exponent) for rank in range(1, n + 1)]
+
+
+def city_rows(n):
+    names = CITY_NAMES[:n] + [f'Town {i}' for i in range(len(CITY_NAMES), n)]
+    return [{'name': name, 'country': 'Morocco'} for name in names]
+
+
+def category_rows(n):
+    rows = [{'name': name, 'description': description} for name, description, _, _ in CATEGORIES[:n]]
+    rows += [{'name': f'Category {i}', 'description': None} for i in range(len(CATEGORIES), n)]
+    return rows
+
+
+# (price multiplier, popularity weight) by category name
+CATEGORY_PROFILES = {name: (multiplier, weight) for name, _, multiplier, weight in CATEGORIES}
+DEFAULT_PROFILE = (1.0, 2)
+
+
+def hotel_rows(rng, count, city_ids, category_ids, start=0, now=None):
+    """Yield ``count`` synthetic hotel rows numbered from ``start``.
+
+    ``city_ids`` are (id, name) pairs, most popular first; ``category_ids``
+    are (id, name) pairs weighted by CATEGORIES.
+    """
+    now = now or datetime.utcnow()
+    # Cumulative weights so choices() does not re-sum them on every call
+    city_weights = list(itertools.accumulate(zipf_weights(len(city_ids))))
+    profiles = [CATEGORY_PROFILES.get(name, DEFAULT_PROFILE) for _, name in category_ids]
+    category_weights = list(itertools.accumulate(weight for _, weight in profiles))
+    category_indexes = range(len(category_ids))
+    amenity_odds = [(name, 0.95 - rank * 0.05) for rank, name in enumerate(AMENITIES)]
+    for i in range(start, start + count):
+        city_id, city_name = rng.choices(city_ids, cum_weights=city_weights)[0]
+        category_index = rng.choices(category_indexes, cum_weights=category_weights)[0]
+        category_id, category_name = category_ids[category_index]
+        multiplier = profiles[category_index][0]
+        price = round(MEDIAN_PRICE * multiplier * rng.lognormvariate(0, 0.45), 2)
+        # Ratings cluster around 4 with a tail of poorly reviewed hotels
+        rating = round(1 + 4 * rng.betavariate(7, 2.2), 1)
+        tier = min(1.0, math.log(price / 20, 20)) if price > 20 else 0.0
+        scale = 0.4 + 0.6 * tier
+        amenities = [name for name, odds in amenity_odds if rng.random() < odds * scale]
+        name = f"{rng.choice(NAME_PREFIXES)} {rng.choice(NAME_WORDS)} {i}"
+        yield {
+            'name': name,
+            'description': f"{category_name} in {city_name} with "
+                           f"{', '.join(amenities[:3]).lower() or 'basic comforts'}.",
+            'address': f"{rng.randint(1, 250)} {rng.choice(STREETS)} {rng.choice(NAME_WORDS)}, {city_name}",
+            'rating': rating,
+            'price_per_night': price,
+            'amenities': ', '.join(amenities),
+            'image_url': f"https://picsum.photos/seed/hotel{i}/500/300",
+            'is_available': rng.random() < 0.92,
+            'created_at': now - timedelta(seconds=rng.randint(0, 3 * 365 * 24 * 3600)),
+            'city_id': city_id,
+            'category_id': category_id,
+        }
+
+
+def copy_rows(table, rows):
+    """Load ``rows`` (dicts with the same keys) into ``table`` with PostgreSQL COPY"""
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['\\N' if row[column] is None else row[column] for column in columns])
+    buffer.seek(0)
+    sql = f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    cursor = db.session.connection().connection.cursor()
+    if hasattr(cursor, 'copy_expert'):  # psycopg2
+        cursor.copy_expert(sql, buffer)
+    else:  # psycopg 3
+        with cursor.copy(sql) as copy:
+            copy.write(buffer.getvalue())
+
+
+def insert_rows(table, rows):
+    """Bulk insert ``rows`` with COPY where available, else executemany"""
+    if not rows:
+        return
+    if db.engine.dialect.name == 'postgresql' and db.engine.dialect.driver in ('psycopg2', 'psycopg'):
+        copy_rows(table, rows)
+    else:
+        db.session.execute(table.insert(), rows)
+
+
+def id_pairs(model, names):
+    """(id, name) of the ``model`` rows named ``names``, in that order"""
+    ids = {name: id for id, name in db.session.query(model.id, model.name).filter(model.name.in_(names))}
+    return [(ids[name], name) for name in names]
+
+
+def next_hotel_number():
+    """Number for the next generated hotel name, keeping (name, city) unique across runs"""
+    return (db.session.query(db.func.max(Hotel.id)).scalar() or 0) + 1
+
+
+def insert_hotels(rows, count, chunk_size, progress=None):
+    """Insert ``count`` rows from the ``rows`` iterator in committed chunks"""
+    done = 0
+    while done < count:
+        chunk = [row for _, row in zip(range(min(chunk_size, count - done)), rows)]
+        if not chunk:
+            break
+        insert_rows(Hotel.__table__, chunk)
+        db.session.commit()
+        done += len(chunk)
+        if progress is not None:
+            progress(done, count)
+
+
+def generate_dataset(hotels, cities=40, categories=12, users=0, seed=42, chunk_size=20000,
+                     reset=False, progress=None):
+    """Generate the dataset; returns counts of the rows inserted.
+
+    ``progress(done, total)`` is called after each chunk of hotels. Call
+    within an app context.
+    """
+    rng = random.Random(seed)
+    hotel_indexes = list(Hotel.__table__.indexes)
+    if reset:
+        db.drop_all()
+    db.create_all()
+    if reset:
+        # Building the indexes once after the load beats maintaining them per row
+        for index in hotel_indexes:
+            index.drop(db.engine)
+
+    existing_cities = {name for (name,) in db.session.query(City.name)}
+    insert_rows(City.__table__, [row for row in city_rows(cities) if row['name'] not in existing_cities])
+    existing_categories = {name for (name,) in db.session.query(HotelCategory.name)}
+    insert_rows(HotelCategory.__table__,
+                [row for row in category_rows(categories) if row['name'] not in existing_categories])
+
+    if users:
+        password_hash = hash_password('password')
+        start = db.session.query(db.func.count(User.id)).scalar()
+        insert_rows(User.__table__, [{
+            'username': f'loadtest{i}',
+            'email': f'loadtest{i}@example.com',
+            'password_hash': password_hash,
+            'is_admin': False,
+            'created_at': datetime.utcnow(),
+        } for i in range(start, start + users)])
+    db.session.commit()
+
+    city_ids = id_pairs(City, [row['name'] for row in city_rows(cities)])
+    category_ids = id_pairs(HotelCategory, [row['name'] for row in category_rows(categories)])
+    insert_hotels(hotel_rows(rng, hotels, city_ids, category_ids, start=next_hotel_number()),
+                  hotels, chunk_size, progress)
+
+    if reset:
+        create_missing_indexes()
+    create_search_indexes()
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+    invalidate_reference_data()  # running workers drop cached pages and reference data
+    return {'cities': len(city_ids), 'categories': len(category_ids), 'users': users, 'hotels': hotels}
+
+
+def generate_city_hotels(city_names, per_city, seed=None, progress=None):
+    """Add ``per_city`` generated hotels to each named city, creating missing cities.
+
+    Uses the existing categories (creating the standard ones if there are
+    none). ``progress(done, total)`` is called after each city.
+    """
+    rng = random.Random(seed)
+    existing = {name for (name,) in db.session.query(City.name).filter(City.name.in_(city_names))}
+    insert_rows(City.__table__, [{'name': name, 'country': 'Morocco'}
+                                 for name in city_names if name not in existing])
+    if not db.session.query(HotelCategory.id).first():
+        insert_rows(HotelCategory.__table__, category_rows(len(CATEGORIES)))
+    db.session.commit()
+
+    city_ids = id_pairs(City, city_names)
+    category_ids = [(id, name) for id, name in db.session.query(HotelCategory.id, HotelCategory.name)
+                    .order_by(HotelCategory.id)]
+    for done, city in enumerate(city_ids, 1):
+        rows = hotel_rows(rng, per_city, [city], category_ids, start=next_hotel_number())
+        insert_hotels(rows, per_city, per_city)
+        if progress is not None:
+            progress(done, len(city_ids))
+    invalidate_reference_data()
+    return {'cities': len(city_ids), 'hotels': per_city * len(city_ids)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic hotel catalogue for load testing')
+    parser.add_argument('--hotels', type=int, default=100000)
+    parser.add_argument('--cities', type=int, default=40)
+    parser.add_argument('--categories', type=int, default=12)
+    parser.add_argument('--users', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-size', type=int, default=20000)
+    parser.add_argument('--reset', action='store_true', help='drop and recreate all tables first')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+
+    def report(done, total):
+        elapsed = time.perf_counter() - started
+        print(f"{done}/{total} hotels ({done / elapsed:,.0f} rows/s)", end='\r')
+
+    with app.app_context():
+        print(f"Generating into {db.engine.url.render_as_string(hide_password=True)}")
+        counts = generate_dataset(args.hotels, args.cities, args.categories, args.users, args.seed,
+                                  args.chunk_size, args.reset, progress=report)
+    print()
+    print(f"Inserted {counts['hotels']} hotels, {counts['users']} users, "
+          f"{counts['cities']} cities, {counts['categories']} categories "
+          f"in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
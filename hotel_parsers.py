@@ -0,0 +1,153 @@
+"""
+HTML extraction backends for Booking.com search result pages.
+The fields of a property card are described once, declaratively, in
+CARD_FIELDS and compiled up front into lookups for each backend:
+
+- 'lxml': lxml.html with precompiled XPath expressions (fastest)
+- 'soup-lxml': BeautifulSoup on the lxml tree builder
+- 'soup': BeautifulSoup on the stdlib html.parser
+
+The BeautifulSoup backends use a SoupStrainer so only property-card subtrees
+are built instead of the whole page. lxml is optional; without it 'soup' is
+the default.
+"""
+
+import re
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.dammit import EncodingDetector
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:  # pragma: no cover - depends on the environment
+    lxml = None
+
+# Result cards, tried in order: (tag, attribute, value, exact). exact=False
+# matches a substring of the attribute, as with Booking.com's generated classes.
+CARD_SELECTORS = [
+    ('div', 'data-testid', 'property-card', True),
+    ('div', 'class', 'sr_item', False),
+]
+
+# Card fields, each with selectors tried in order until one matches
+CARD_FIELDS = {
+    'name': [('h3', None, None, True), ('h2', None, None, True),
+             ('a', 'data-testid', 'title-link', True)],
+    'address': [('span', 'data-testid', 'address', True), ('span', 'class', 'address', False)],
+    'price': [('span', 'data-testid', 'price-and-discounted-price', True), ('div', 'class', 'price', False)],
+    'rating': [('div', 'data-testid', 'review-score', True), ('div', 'class', 'rating', False)],
+    'review': [('div', 'data-testid', 'review-score-word', True), ('span', 'class', 'review', False)],
+    'description': [('div', 'class', 'important_facility', False), ('div', 'class', 'facility', False)],
+}
+
+
+def _soup_args(selector):
+    tag, attribute, value, exact = selector
+    if attribute is None:
+        return tag, {}
+    return tag, {attribute: value if exact else re.compile(re.escape(value))}
+
+
+def _xpath(selector, prefix='.//'):
+    tag, attribute, value, exact = selector
+    if attribute is None:
+        return f'{prefix}{tag}'
+    if exact:
+        return f'{prefix}{tag}[@{attribute}="{value}"]'
+    return f'{prefix}{tag}[contains(@{attribute}, "{value}")]'
+
+
+class SoupCardParser:
+    """BeautifulSoup backend that only builds property-card subtrees"""
+
+    def __init__(self, features='html.parser'):
+        self.features = features
+        self._cards = [(SoupStrainer(*_soup_args(selector)), _soup_args(selector))
+                       for selector in CARD_SELECTORS]
+        self._fields = {field: [_soup_args(selector) for selector in selectors]
+                        for field, selectors in CARD_FIELDS.items()}
+
+    def cards(self, content):
+        """Property card elements of a results page"""
+        for strainer, (tag, attrs) in self._cards:
+            soup = BeautifulSoup(content, self.features, parse_only=strainer)
+            cards = soup.find_all(tag, attrs)
+            if cards:
+                return cards
+        return []
+
+    def fields(self, card):
+        """Raw text of each CARD_FIELDS entry (None if absent) plus 'image_url'"""
+        values = {}
+        for field, lookups in self._fields.items():
+            values[field] = None
+            for tag, attrs in lookups:
+                element = card.find(tag, attrs)
+                if element is not None:
+                    values[field] = element.get_text(strip=True)
+                    break
+        img = card.find('img')
+        values['image_url'] = (img.get('src') or img.get('data-src')) if img else None
+        return values
+
+
+class LxmlCardParser:
+    """lxml backend evaluating precompiled XPath expressions"""
+
+    def __init__(self):
+        self._cards = [etree.XPath(_xpath(selector, prefix='//')) for selector in CARD_SELECTORS]
+        self._fields = {field: [etree.XPath(f'({_xpath(selector)})[1]') for selector in selectors]
+                        for field, selectors in CARD_FIELDS.items()}
+        self._img = etree.XPath('(.//img)[1]')
+        self._html_parsers = {}
+
+    def _parse(self, content):
+        if isinstance(content, str):
+            return lxml.html.fromstring(content)
+        # lxml assumes Latin-1 for bytes without a declared charset; default to UTF-8
+        encoding = EncodingDetector.find_declared_encoding(content, is_html=True) or 'utf-8'
+        if encoding not in self._html_parsers:
+            self._html_parsers[encoding] = lxml.html.HTMLParser(encoding=encoding)
+        return lxml.html.fromstring(content, parser=self._html_parsers[encoding])
+
+    def cards(self, content):
+        """Property card elements of a results page"""
+        document = self._parse(content)
+        for xpath in self._cards:
+            cards = xpath(document)
+            if cards:
+                return cards
+        return []
+
+    def fields(self, card):
+        """Raw text of each CARD_FIELDS entry (None if absent) plus 'image_url'"""
+        values = {}
+        for field, lookups in self._fields.items():
+            values[field] = None
+            for xpath in lookups:
+                found = xpath(card)
+                if found:
+                    # Same text as BeautifulSoup's get_text(strip=True)
+                    values[field] = ''.join(text.strip() for text in found[0].itertext())
+                    break
+        img = self._img(card)
+        values['image_url'] = (img[0].get('src') or img[0].get('data-src')) if img else None
+        return values
+
+
+PARSERS = {
+    'lxml': LxmlCardParser,
+    'soup-lxml': lambda: SoupCardParser('lxml'),
+    'soup': lambda: SoupCardParser('html.parser'),
+}
+DEFAULT_PARSER = 'lxml' if lxml is not None else 'soup'
+
+
+def get_parser(name=None):
+    """Instantiate the named parser backend (DEFAULT_PARSER when None)"""
+    name = name or DEFAULT_PARSER
+    if name not in PARSERS:
+        raise ValueError(f"Unknown parser backend {name!r}; choose from {', '.join(PARSERS)}")
+    if lxml is None and name != 'soup':
+        raise ValueError(f"Parser backend {name!r} needs lxml installed")
+    return PARSERS[name]()
@@ -0,0 +1,150 @@
+"""
+On-disk HTTP response cache for the scraper.
+Responses are stored zlib-compressed in a FileSystemCache directory, one file
+per request named after the hash of the method and canonical URL (query
+parameters sorted), so the same search always maps to the same entry. The
+directory is capped at ``max_bytes`` with least-recently-used eviction.
+
+An entry younger than ``ttl`` seconds is served without touching the network.
+An older one is revalidated with If-None-Match / If-Modified-Since and reused
+on 304 Not Modified. In offline mode entries are replayed regardless of age
+and a request with no entry raises OfflineCacheMiss instead of being sent.
+"""
+
+import json
+import struct
+import time
+import zlib
+import requests
+from requests.structures import CaseInsensitiveDict
+from cache import FileSystemCache
+
+# Response headers kept with the body
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+class OfflineCacheMiss(Exception):
+    """A request had no cached response while the cache was in offline mode"""
+
+
+class CachedEntry:
+    """A stored response: status, the headers in STORED_HEADERS, body and fetch time"""
+
+    HEADER = struct.Struct('!I')  # length of the JSON metadata
+
+    def __init__(self, url, status_code, headers, content, fetched_at):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.fetched_at = fetched_at
+
+    @classmethod
+    def from_response(cls, response):
+        headers = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+        return cls(response.url, response.status_code, headers, response.content, time.time())
+
+    def age(self):
+        return time.time() - self.fetched_at
+
+    def validators(self):
+        """Conditional request headers for revalidating this entry"""
+        headers = {}
+        if 'ETag' in self.headers:
+            headers['If-None-Match'] = self.headers['ETag']
+        if 'Last-Modified' in self.headers:
+            headers['If-Modified-Since'] = self.headers['Last-Modified']
+        return headers
+
+    def to_response(self):
+        """A requests.Response carrying the cached body"""
+        response = requests.Response()
+        response.url = self.url
+        response.status_code = self.status_code
+        response.headers = CaseInsensitiveDict(self.headers)
+        response._content = self.content
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        return response
+
+    def dumps(self):
+        meta = json.dumps({'url': self.url, 'status': self.status_code,
+                           'headers': self.headers, 'fetched_at': self.fetched_at}).encode()
+        return self.HEADER.pack(len(meta)) + meta + zlib.compress(self.content)
+
+    @classmethod
+    def loads(cls, data):
+        (length,) = cls.HEADER.unpack_from(data)
+        start = cls.HEADER.size
+        meta = json.loads(data[start:start + length])
+        content = zlib.decompress(data[start + length:])
+        return cls(meta['url'], meta['status'], meta['headers'], content, meta['fetched_at'])
+
+
+class HTTPCache:
+    """Response cache with TTL freshness, conditional revalidation and offline replay"""
+
+    # Entries are kept on disk this long after their last use; eviction by
+    # size normally happens well before
+    RETENTION = 365 * 24 * 3600
+
+    def __init__(self, directory, ttl=3600, max_bytes=256 * 1024 * 1024, offline=False):
+        self.ttl = ttl
+        self.offline = offline
+        self.store = FileSystemCache(directory, max_bytes)
+        self.fresh_hits = self.revalidated = self.fetched = 0
+
+    @staticmethod
+    def key(method, url, params=None):
+        """Canonical form of a request: method and URL with sorted query parameters"""
+        request = requests.Request(method, url, params=sorted((params or {}).items()))
+        return f'{method} {request.prepare().url}'
+
+    def lookup(self, key):
+        """The stored entry for ``key``, or None"""
+        data = self.store.get(key)
+        if data is None:
+            return None
+        try:
+            return CachedEntry.loads(data)
+        except (struct.error, ValueError, KeyError, zlib.error):
+            return None
+
+    def save(self, key, entry):
+        self.store.set(key, entry.dumps(), self.RETENTION)
+
+    def get(self, url, params, send):
+        """GET ``url`` through the cache.
+
+        ``send(headers)`` performs the network request with the extra
+        (conditional) headers, so the caller can wrap it in rate limiting and
+        retries. Only 200 responses are stored.
+        """
+        key = self.key('GET', url, params)
+        entry = self.lookup(key)
+        if entry is not None and (self.offline or entry.age() < self.ttl):
+            self.fresh_hits += 1
+            return entry.to_response()
+        if self.offline:
+            raise OfflineCacheMiss(f"No cached response for {key}")
+
+        headers = entry.validators() if entry is not None else {}
+        response = send(headers)
+        if response.status_code == 304 and entry is not None:
+            self.revalidated += 1
+            entry.fetched_at = time.time()
+            self.save(key, entry)
+            return entry.to_response()
+
+        self.fetched += 1
+        if response.status_code == 200:
+            self.save(key, CachedEntry.from_response(response))
+        return response
+
+    def clear(self):
+        self.store.clear()
+
+    def stats(self):
+        stats = self.store.stats()
+        stats.update({'fresh_hits': self.fresh_hits, 'revalidated': self.revalidated,
+                      'fetched': self.fetched})
+        return stats
@@ -0,0 +1,99 @@
+"""
+Set-based hotel ingest.
+upsert_hotels() writes a batch of hotel rows in chunks. For each chunk one
+SELECT finds the rows that already exist (hotels are unique on name and
+city), then a single bulk INSERT writes the new ones. On SQLite and
+PostgreSQL the INSERT is an ON CONFLICT statement against the
+uq_hotel_name_city index, so a hotel added concurrently is skipped (or
+updated) instead of failing the batch. With update_existing=True, existing
+hotels get the incoming price and rating.
+"""
+
+from sqlalchemy import insert, select, tuple_, update
+from app import app, db
+from models import Hotel
+
+app.config.setdefault("INGEST_CHUNK_SIZE", 500)
+
+CONFLICT_COLUMNS = ('name', 'city_id')
+# Columns refreshed on existing hotels when update_existing=True
+UPDATE_COLUMNS = ('price_per_night', 'rating')
+
+
+def _dialect_insert():
+    """The dialect's INSERT supporting ON CONFLICT, or None if it has none"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+
+def _existing(keys):
+    """(name, city_id) -> (id, price_per_night, rating) of the hotels among ``keys``"""
+    rows = db.session.execute(
+        select(Hotel.name, Hotel.city_id, Hotel.id, Hotel.price_per_night, Hotel.rating)
+        .where(tuple_(Hotel.name, Hotel.city_id).in_(keys)))
+    return {(name, city_id): (hotel_id, price, rating) for name, city_id, hotel_id, price, rating in rows}
+
+
+def _write(new_rows, changed_rows, dialect_insert):
+    if dialect_insert is not None:
+        statement = dialect_insert(Hotel)
+        if changed_rows:
+            statement = statement.on_conflict_do_update(
+                index_elements=list(CONFLICT_COLUMNS),
+                set_={column: statement.excluded[column] for column in UPDATE_COLUMNS})
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=list(CONFLICT_COLUMNS))
+        rows = new_rows + [row for _, row in changed_rows]
+        if rows:
+            db.session.execute(statement, rows)
+        return
+
+    if new_rows:
+        db.session.execute(insert(Hotel), new_rows)
+    if changed_rows:
+        db.session.execute(update(Hotel), [
+            dict({column: row[column] for column in UPDATE_COLUMNS}, id=hotel_id)
+            for hotel_id, row in changed_rows])
+
+
+def upsert_hotels(rows, update_existing=False, chunk_size=None):
+    """Insert hotel rows (dicts of Hotel column values) in chunks.
+
+    Existing hotels, matched on name and city_id, are skipped, or with
+    ``update_existing`` get the row's price and rating. Duplicates within
+    ``rows`` keep the last occurrence. Returns {'inserted', 'updated', 'skipped'} counts;
+    the caller commits.
+    """
+    chunk_size = chunk_size or app.config['INGEST_CHUNK_SIZE']
+    dialect_insert = _dialect_insert()
+    counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+
+    unique = {}
+    for row in rows:
+        unique[(row['name'], row['city_id'])] = row
+    counts['skipped'] += len(rows) - len(unique)
+
+    items = list(unique.items())
+    for start in range(0, len(items), chunk_size):
+        chunk = items[start:start + chunk_size]
+        existing = _existing([key for key, _ in chunk])
+        new_rows, changed_rows = [], []
+        for key, row in chunk:
+            if key not in existing:
+                new_rows.append(row)
+                continue
+            hotel_id, price, rating = existing[key]
+            if update_existing and (row['price_per_night'], row['rating']) != (price, rating):
+                changed_rows.append((hotel_id, row))
+            else:
+                counts['skipped'] += 1
+        _write(new_rows, changed_rows, dialect_insert)
+        counts['inserted'] += len(new_rows)
+        counts['updated'] += len(changed_rows)
+    return counts
@@ -0,0 +1,86 @@
+"""
+Opt-in per-request timing instrumentation.
+With SQL_INSTRUMENTATION enabled (config or environment), every request
+measures time spent in SQL statements (engine events), in template rendering
+(Flask's template signals) and in total, and reports them in a Server-Timing
+header:
+
+    Server-Timing: db;dur=12.4;desc="5 queries", tpl;dur=3.1, total;dur=18.0
+
+Browsers show it in the network panel and load-test tools can record it.
+Statements slower than SLOW_QUERY_MS are logged as warnings with the
+endpoint that issued them. Query counts come from query_budget.
+"""
+
+import logging
+import os
+import time
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import app
+from query_budget import query_count
+
+app.config.setdefault("SQL_INSTRUMENTATION", os.environ.get("SQL_INSTRUMENTATION", "") in ("1", "true", "yes"))
+app.config.setdefault("SLOW_QUERY_MS", 100)
+
+logger = logging.getLogger(__name__)
+
+
+def enabled():
+    return app.config['SQL_INSTRUMENTATION']
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    if enabled():
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _end_query(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    elapsed = (time.perf_counter() - started.pop()) * 1000
+    endpoint = None
+    if has_request_context():
+        g.db_ms = g.get('db_ms', 0.0) + elapsed
+        endpoint = request.endpoint
+    if elapsed >= app.config['SLOW_QUERY_MS']:
+        logger.warning("Slow query (%.1f ms) in %s: %s", elapsed, endpoint or 'no request',
+                       ' '.join(statement.split()))
+
+
+def _start_render(sender, template, context, **extra):
+    if enabled():
+        g.render_started = time.perf_counter()
+
+
+def _end_render(sender, template, context, **extra):
+    started = g.pop('render_started', None)
+    if started is not None:
+        g.template_ms = g.get('template_ms', 0.0) + (time.perf_counter() - started) * 1000
+
+
+before_render_template.connect(_start_render, app)
+template_rendered.connect(_end_render, app)
+
+
+@app.before_request
+def _start_request():
+    if enabled():
+        g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _server_timing(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    total = (time.perf_counter() - started) * 1000
+    timings = [f'db;dur={g.get("db_ms", 0.0):.1f};desc="{query_count()} queries"',
+               f'tpl;dur={g.get("template_ms", 0.0):.1f}',
+               f'total;dur={total:.1f}']
+    response.headers.add('Server-Timing', ', '.join(timings))
+    return response
@@ -0,0 +1,250 @@
+"""
+Background jobs without an external broker.
+Jobs are rows in the job table: enqueue() inserts a queued row and returns at
+once. Each web process runs a JobRunner whose worker threads claim the oldest
+queued job with a conditional UPDATE, so a job runs once even when several
+gunicorn workers poll the same table, and a claim only succeeds while fewer
+than JOB_MAX_CONCURRENT jobs are running. On PostgreSQL claims also take a
+transaction-level advisory lock: under READ COMMITTED two concurrent UPDATEs
+could otherwise both count the running jobs before either commits.
+
+The runner starts with the first request a process serves (or its first
+enqueue), so queued jobs resume and stale running ones are failed once a
+restarted worker takes traffic. Importing the app, or a gunicorn --preload
+master that never serves, starts no threads and issues no SQL.
+
+Handlers are registered per kind with @job_handler and called with a
+JobContext plus the job's params. They report progress through the context
+and call check_cancelled() between units of work: cancelling a queued job
+takes effect immediately, a running one stops at its next check.
+"""
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, text
+from app import app, db
+from models import Job
+import metrics
+
+# worker threads per process; 0 disables the runner
+app.config.setdefault("JOB_WORKERS", int(os.environ.get("JOB_WORKERS", 2)))
+# running jobs across all processes
+app.config.setdefault("JOB_MAX_CONCURRENT", int(os.environ.get("JOB_MAX_CONCURRENT", 2)))
+app.config.setdefault("JOB_POLL_INTERVAL", float(os.environ.get("JOB_POLL_INTERVAL", 2.0)))
+# seconds without a heartbeat before a running job is failed
+app.config.setdefault("JOB_STALE_AFTER", int(os.environ.get("JOB_STALE_AFTER", 600)))
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+
+CLAIM_LOCK_KEY = 0x6a6f6273  # 'jobs'
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when its job was cancelled"""
+
+
+def job_handler(kind):
+    """Register the decorated function as the handler for jobs of ``kind``"""
+    def register(f):
+        HANDLERS[kind] = f
+        return f
+    return register
+
+
+class JobContext:
+    """Progress reporting and cancellation checks for a running job"""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    def progress(self, done, total=None, message=None):
+        """Record ``done`` units of work (of ``total``) and refresh the heartbeat"""
+        values = {Job.progress: done, Job.heartbeat_at: datetime.utcnow()}
+        if total is not None:
+            values[Job.total] = total
+        if message is not None:
+            values[Job.message] = message[:300]
+        Job.query.filter_by(id=self.job_id).update(values, synchronize_session=False)
+        db.session.commit()
+
+    def cancel_requested(self):
+        return bool(db.session.query(Job.cancel_requested).filter_by(id=self.job_id).scalar())
+
+    def check_cancelled(self):
+        """Raise JobCancelled if the job was cancelled"""
+        if self.cancel_requested():
+            raise JobCancelled()
+
+
+def enqueue(kind, params=None, user_id=None):
+    """Queue a job of ``kind`` and return it; a runner thread picks it up"""
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind {kind!r}")
+    job = Job(kind=kind, params=json.dumps(params or {}), created_by_id=user_id)
+    db.session.add(job)
+    db.session.commit()
+    runner.start()
+    runner.wake()
+    return job
+
+
+def cancel(job_id):
+    """Cancel a queued job, or ask a running one to stop; returns False if it had finished"""
+    now = datetime.utcnow()
+    cancelled = Job.query.filter_by(id=job_id, status='queued').update(
+        {Job.status: 'cancelled', Job.cancel_requested: True, Job.finished_at: now},
+        synchronize_session=False)
+    if not cancelled:
+        cancelled = Job.query.filter_by(id=job_id, status='running').update(
+            {Job.cancel_requested: True}, synchronize_session=False)
+    db.session.commit()
+    return bool(cancelled)
+
+
+class JobRunner:
+    """Worker threads polling the job table for queued jobs"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Start the worker threads once per process"""
+        workers = app.config['JOB_WORKERS']
+        if self._threads or not workers:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(workers):
+                thread = threading.Thread(target=self._work, args=(i == 0,), name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _reset_after_fork(self):
+        # Threads do not survive fork and the lock may have been held; the
+        # child's first request starts its own
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def wake(self):
+        self._wakeup.set()
+
+    def fail_stale_jobs(self):
+        """Fail running jobs whose process stopped sending heartbeats"""
+        cutoff = datetime.utcnow() - timedelta(seconds=app.config['JOB_STALE_AFTER'])
+        failed = Job.query.filter(Job.status == 'running', Job.heartbeat_at < cutoff).update(
+            {Job.status: 'failed', Job.error: 'Worker stopped responding', Job.finished_at: datetime.utcnow()},
+            synchronize_session=False)
+        db.session.commit()
+        if failed:
+            logger.warning("Marked %d stale job(s) as failed", failed)
+
+    def claim(self):
+        """Move the oldest claimable queued job to running and return its id, or None"""
+        running = select(func.count()).select_from(Job).where(Job.status == 'running').scalar_subquery()
+        candidates = db.session.query(Job.id).filter_by(status='queued').order_by(Job.id).limit(5).all()
+        postgres = db.engine.dialect.name == 'postgresql'
+        for (job_id,) in candidates:
+            if postgres:
+                # Held until the commit below; the UPDATE's count is taken after it, so it
+                # sees any claim committed by the previous holder
+                db.session.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': CLAIM_LOCK_KEY})
+            now = datetime.utcnow()
+            claimed = Job.query.filter(
+                Job.id == job_id, Job.status == 'queued',
+                running < app.config['JOB_MAX_CONCURRENT'],
+            ).update({Job.status: 'running', Job.started_at: now, Job.heartbeat_at: now},
+                     synchronize_session=False)
+            db.session.commit()
+            if claimed:
+                return job_id
+        return None
+
+    def run(self, job_id):
+        """Run a claimed job to completion and record the outcome"""
+        job = db.session.get(Job, job_id)
+        values = {}
+        try:
+            handler = HANDLERS[job.kind]
+            result = handler(JobContext(job_id), **json.loads(job.params or '{}'))
+            values.update({Job.status: 'succeeded', Job.result: json.dumps(result)})
+        except JobCancelled:
+            db.session.rollback()
+            values[Job.status] = 'cancelled'
+        except Exception as e:
+            logger.exception("Job %s failed", job_id)
+            db.session.rollback()
+            values.update({Job.status: 'failed', Job.error: str(e)})
+        values[Job.finished_at] = datetime.utcnow()
+        Job.query.filter_by(id=job_id).update(values, synchronize_session=False)
+        db.session.commit()
+        metrics.inc('jobs_finished_total', kind=job.kind, status=values[Job.status])
+        metrics.flush()
+
+    def _work(self, fail_stale):
+        if fail_stale:
+            try:
+                with app.app_context():
+                    self.fail_stale_jobs()
+            except Exception:
+                logger.exception("Could not fail stale jobs")
+        while True:
+            try:
+                with app.app_context():
+                    job_id = self.claim()
+                    if job_id is not None:
+                        self.run(job_id)
+                        continue
+            except Exception:
+                logger.exception("Job runner error")
+            self._wakeup.wait(app.config['JOB_POLL_INTERVAL'])
+            self._wakeup.clear()
+
+
+runner = JobRunner()
+os.register_at_fork(after_in_child=runner._reset_after_fork)
+
+
+@app.before_request
+def _start_runner():
+    runner.start()
+
+
+@job_handler('scrape')
+def scrape_job(ctx, cities, limit_per_city=5):
+    """Scrape hotels for ``cities``, one unit of progress per city"""
+    from scraper import scrape_moroccan_cities
+
+    ctx.progress(0, len(cities), 'Starting')
+    done = []
+
+    def city_done(city, counts):
+        done.append(city)
+        inserted = counts['inserted'] if counts else 0
+        ctx.progress(len(done), message=f"{city}: {inserted} new hotel(s)")
+        return not ctx.cancel_requested()
+
+    inserted = scrape_moroccan_cities(cities, limit_per_city, on_city_done=city_done)
+    ctx.check_cancelled()
+    return {'inserted': inserted, 'cities': done}
+
+
+@job_handler('generate')
+def generate_job(ctx, cities, hotels_per_city=5):
+    """Add synthetic hotels to ``cities``, one unit of progress per city"""
+    from generate_dataset import generate_city_hotels
+
+    ctx.progress(0, len(cities), 'Starting')
+
+    def city_done(done, total):
+        ctx.progress(done, message=f"{done}/{total} cities")
+        ctx.check_cancelled()
+
+    return generate_city_hotels(cities, hotels_per_city, progress=city_done)
@@ -0,0 +1,185 @@
+"""
+Non-blocking structured logging.
+configure_logging() puts a QueueHandler on the root logger, so logging from a
+request thread only appends the record to an in-memory queue. A QueueListener
+thread formats records and writes them to stderr, one JSON object per line
+(LOG_FORMAT=text for human-readable lines):
+
+    {"ts": "...", "level": "INFO", "logger": "access", "message": "GET /hotels 200",
+     "request_id": "5f0c...", "endpoint": "hotels", "method": "GET", "status": 200,
+     "duration_ms": 4.2}
+
+Records logged during a request carry its request id (from an X-Request-ID
+header, or generated and echoed back), endpoint and method. Each request ends
+with a record on the 'access' logger.
+
+Levels come from the environment: LOG_LEVEL for the root logger (default
+INFO) and LOG_LEVELS for subsystems, e.g.
+"sqlalchemy.engine=INFO,scraper=DEBUG,access=WARNING". SQLAlchemy and urllib3
+default to WARNING. With LOG_DEBUG_SAMPLE=N only one in N DEBUG records per
+logger is kept; kept records carry "sampled": N.
+
+The queue is unbounded: if stderr is slower than the log rate, memory grows
+instead of requests blocking.
+"""
+
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from flask import g, has_request_context, request
+from app import app
+
+DEFAULT_LEVELS = {'sqlalchemy': 'WARNING', 'urllib3': 'WARNING'}
+# LogRecord attributes that are not extra fields
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_handler = None
+_listener = None
+
+
+class RequestContextFilter(logging.Filter):
+    """Adds the current request's id, endpoint and method to records"""
+
+    def filter(self, record):
+        if has_request_context() and 'request_id' in g:
+            record.request_id = g.request_id
+            record.endpoint = request.endpoint
+            record.method = request.method
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """Keeps one in ``every`` DEBUG records per logger"""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = every
+        self._counters = {}
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.every <= 1:
+            return True
+        counter = self._counters.get(record.name)
+        if counter is None:
+            counter = self._counters.setdefault(record.name, itertools.count())
+        if next(counter) % self.every:
+            return False
+        record.sampled = self.every
+        return True
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps extra fields and tracebacks apart from the message"""
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, with any extra fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The message followed by its extra fields as key=value pairs"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        extra = ' '.join(f'{key}={value}' for key, value in record.__dict__.items()
+                         if key not in RECORD_ATTRIBUTES)
+        return f'{line} [{extra}]' if extra else line
+
+
+def parse_levels(spec):
+    """{'logger': 'LEVEL'} from "logger=LEVEL,other=LEVEL" """
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, level = item.partition('=')
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _start_listener():
+    global _listener
+    _handler.queue = queue.SimpleQueue()
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(TextFormatter() if os.environ.get('LOG_FORMAT') == 'text' else JSONFormatter())
+    _listener = logging.handlers.QueueListener(_handler.queue, stream, respect_handler_level=False)
+    _listener.start()
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def configure_logging(level=None):
+    """Route all logging through the queue; safe to call more than once"""
+    global _handler
+    root = logging.getLogger()
+    root.setLevel(level or os.environ.get('LOG_LEVEL', 'INFO').upper())
+    for name, subsystem_level in {**DEFAULT_LEVELS, **parse_levels(os.environ.get('LOG_LEVELS', ''))}.items():
+        logging.getLogger(name).setLevel(subsystem_level)
+    if _handler is not None:
+        return
+    _handler = StructuredQueueHandler(queue.SimpleQueue())
+    _handler.addFilter(DebugSampler(int(os.environ.get('LOG_DEBUG_SAMPLE', 1))))
+    _handler.addFilter(RequestContextFilter())
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_handler)
+    _start_listener()
+    atexit.register(_stop_listener)
+    # A listener thread started before fork (gunicorn --preload) does not run in workers
+    os.register_at_fork(after_in_child=_start_listener)
+
+
+@app.before_request
+def _assign_request_id():
+    g.request_id = request.headers.get('X-Request-ID', '')[:64] or uuid.uuid4().hex
+    g.log_started = time.perf_counter()
+
+
+@app.after_request
+def _log_request(response):
+    started = g.get('log_started')
+    if started is None:
+        return response
+    response.headers['X-Request-ID'] = g.request_id
+    logging.getLogger('access').info(
+        "%s %s %s", request.method, request.full_path.rstrip('?'), response.status_code,
+        extra={'status': response.status_code, 'duration_ms': round((time.perf_counter() - started) * 1000, 2)})
+    return response
@@ -0,0 +1,225 @@
+"""
+Prometheus metrics at /metrics.
+Each process keeps counters and histograms in memory: requests by endpoint,
+method and status, request latency by endpoint, finished jobs and saved
+scraped hotels. Connection pool gauges for the engine in app.py and job queue
+gauges are read when /metrics is scraped. Recording a request is a lock and a
+few dict updates.
+
+Under gunicorn, set METRICS_DIR (or PROMETHEUS_MULTIPROC_DIR) to a directory
+shared by the workers. Each worker then writes a snapshot there at most every
+METRICS_FLUSH_INTERVAL seconds. /metrics sums the counters and histograms of
+every snapshot and reports pool gauges per pid for live workers only. Set
+METRICS_TOKEN to require "Authorization: Bearer <token>".
+"""
+
+import bisect
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from flask import Blueprint, Response, abort, g, request
+from sqlalchemy import func
+from app import app, db
+from models import Job
+
+app.config.setdefault("METRICS_DIR", os.environ.get("METRICS_DIR") or os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+app.config.setdefault("METRICS_FLUSH_INTERVAL", 5)
+app.config.setdefault("METRICS_TOKEN", os.environ.get("METRICS_TOKEN"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'http_requests_total': ('counter', 'Requests by endpoint, method and status'),
+    'http_request_duration_seconds': ('histogram', 'Request latency by endpoint'),
+    'jobs_finished_total': ('counter', 'Background jobs finished, by kind and status'),
+    'scraper_hotels_total': ('counter', 'Scraped hotels saved, by result'),
+    'jobs': ('gauge', 'Background jobs by status'),
+    'db_pool_size': ('gauge', 'Configured connection pool size'),
+    'db_pool_checked_out': ('gauge', 'Connections checked out of the pool'),
+    'db_pool_overflow': ('gauge', 'Connections open beyond the pool size'),
+}
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+class Registry:
+    """Thread-safe counters and histograms of one process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+
+    def inc(self, name, labels, amount=1):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+            histogram[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+            histogram[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, labels, list(values)] for (name, labels), values in self.histograms.items()],
+            }
+
+
+registry = Registry()
+_flushed_at = [0.0]
+
+
+def inc(name, amount=1, **labels):
+    """Increment counter ``name`` with ``labels``"""
+    registry.inc(name, tuple(sorted(labels.items())), amount)
+
+
+def pool_gauges():
+    """Pool size, checked-out and overflow connections of the app's engine"""
+    pool = db.engine.pool
+    gauges = {}
+    for name, method in (('db_pool_size', 'size'), ('db_pool_checked_out', 'checkedout'),
+                         ('db_pool_overflow', 'overflow')):
+        if hasattr(pool, method):
+            gauges[name] = getattr(pool, method)()
+    if 'db_pool_overflow' in gauges:
+        # QueuePool counts up from -size until the pool has been filled
+        gauges['db_pool_overflow'] = max(0, gauges['db_pool_overflow'])
+    return gauges
+
+
+def flush(force=False):
+    """Write this process's snapshot to METRICS_DIR (at most every METRICS_FLUSH_INTERVAL)"""
+    directory = app.config['METRICS_DIR']
+    now = time.monotonic()
+    if not directory or (not force and now - _flushed_at[0] < app.config['METRICS_FLUSH_INTERVAL']):
+        return
+    _flushed_at[0] = now
+    snapshot = registry.snapshot()
+    snapshot['pid'] = os.getpid()
+    snapshot['gauges'] = pool_gauges()
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, os.path.join(directory, f'metrics-{os.getpid()}.json'))
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collect():
+    """Counters, histograms and per-pid pool gauges across every worker"""
+    directory = app.config['METRICS_DIR']
+    if not directory:
+        snapshots = [dict(registry.snapshot(), pid=os.getpid(), gauges=pool_gauges())]
+    else:
+        flush(force=True)
+        snapshots = []
+        for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+
+    counters, histograms, gauges = {}, {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            total = histograms.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                total[i] += value
+        # Counters of exited workers still count; their gauges are stale
+        if snapshot['pid'] == os.getpid() or _pid_alive(snapshot['pid']):
+            for name, value in snapshot['gauges'].items():
+                gauges[(name, (('pid', str(snapshot['pid'])),))] = value
+    return counters, histograms, gauges
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    counters, histograms, gauges = collect()
+    for status, count in db.session.query(Job.status, func.count(Job.id)).group_by(Job.status):
+        gauges[('jobs', (('status', status),))] = count
+
+    series = {}
+    for (name, labels), value in counters.items():
+        series.setdefault(name, []).append(f'{name}{_labels(labels)} {value}')
+    for (name, labels), value in gauges.items():
+        series.setdefault(name, []).append(f'{name}{_labels(labels)} {value}')
+    for (name, labels), values in histograms.items():
+        lines = series.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), values[:-1]):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels(labels, [("le", bound)])} {cumulative}')
+        lines.append(f'{name}_sum{_labels(labels)} {values[-1]}')
+        lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+
+    output = []
+    for name in sorted(series):
+        kind, description = HELP.get(name, ('untyped', name))
+        output.append(f'# HELP {name} {description}')
+        output.append(f'# TYPE {name} {kind}')
+        output.extend(series[name])
+    return '\n'.join(output) + '\n'
+
+
+@app.before_request
+def _start_timer():
+    g.metrics_started = time.perf_counter()
+
+
+@app.after_request
+def _record_request(response):
+    started = g.get('metrics_started')
+    if started is not None:
+        endpoint = request.endpoint or 'unmatched'
+        registry.inc('http_requests_total', (('endpoint', endpoint), ('method', request.method),
+                                             ('status', str(response.status_code))))
+        registry.observe('http_request_duration_seconds', (('endpoint', endpoint),),
+                         time.perf_counter() - started)
+        flush()
+    return response
+
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint"""
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        abort(401)
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
@@ -0,0 +1,59 @@
+"""
+Schema migration script for existing databases.
+db.create_all() only creates missing tables, so indexes added to models.py
+later never reach a database that already has them. Run this script after
+pulling model changes to bring an existing database up to date.
+"""
+
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
+from app import app, db
+import models  # noqa: F401
+from search import create_postgres_search_indexes
+
+
+def create_missing_indexes():
+    """Create every index declared on the models that the database lacks"""
+    inspector = inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                print(f"Creating index {index.name} on {table.name}...")
+                try:
+                    index.create(db.engine)
+                except IntegrityError:
+                    # A unique index over existing duplicates; those need resolving by hand
+                    print(f"Skipped {index.name}: {table.name} has duplicate rows for "
+                          f"({', '.join(column.name for column in index.columns)})")
+                    continue
+                created.append(index.name)
+    return created
+
+
+def create_search_indexes():
+    """Install the PostgreSQL search function and full-text indexes (idempotent);
+    returns False on other backends, which search in process"""
+    if db.engine.dialect.name != 'postgresql':
+        return False
+    with db.engine.begin() as connection:
+        create_postgres_search_indexes(connection)
+    return True
+
+
+def migrate():
+    """Create missing tables, indexes and full-text search indexes"""
+    with app.app_context():
+        db.create_all()
+        created = create_missing_indexes()
+        if create_search_indexes():
+            print("Created full-text search indexes")
+        print(f"Migration complete: {len(created)} index(es) created")
+        return created
+
+
+if __name__ == '__main__':
+    migrate()
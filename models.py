@@ -1,7 +1,8 @@
+import json
 from datetime import datetime
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
+from passwords import hash_password, needs_rehash, verify_password
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -12,10 +13,13 @@ class User(UserMixin, db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return needs_rehash(self.password_hash)
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -60,5 +64,95 @@ class Hotel(db.Model):
     city_id = db.Column(db.Integer, db.ForeignKey('city.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('hotel_category.id'), nullable=False)
 
+    # Indexes backing the /hotels filters (always scoped to available hotels
+    # and ordered by rating, id) and the dashboard's recent hotels list, plus
+    # the (name, city) uniqueness the scraper's ingest upserts against
+    __table_args__ = (
+        db.Index('uq_hotel_name_city', 'name', 'city_id', unique=True),
+        db.Index('ix_hotel_available_rating', 'is_available', 'rating', 'id'),
+        db.Index('ix_hotel_city_available_rating', 'city_id', 'is_available', 'rating', 'id'),
+        db.Index('ix_hotel_category_available_rating', 'category_id', 'is_available', 'rating', 'id'),
+        db.Index('ix_hotel_available_price', 'is_available', 'price_per_night'),
+        db.Index('ix_hotel_created_at', 'created_at'),
+    )
+
+    @classmethod
+    def with_relations(cls):
+        """Hotel query with city and category loaded in the same SELECT"""
+        return cls.query.options(db.joinedload(cls.city), db.joinedload(cls.category))
+
     def __repr__(self):
         return f'<Hotel {self.name}>'
+
+class DataVersion(db.Model):
+    """Version counter for a group of cached data, shared by all workers"""
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @classmethod
+    def current(cls, name):
+        """Current version number of ``name`` (0 if it was never bumped)"""
+        version = db.session.query(cls.version).filter_by(name=name).scalar()
+        return version or 0
+
+    @classmethod
+    def bump(cls, name):
+        """Increment the version of ``name`` in the current transaction"""
+        updated = cls.query.filter_by(name=name).update(
+            {cls.version: cls.version + 1, cls.updated_at: datetime.utcnow()},
+            synchronize_session=False)
+        if not updated:
+            db.session.add(cls(name=name, version=1))
+
+    def __repr__(self):
+        return f'<DataVersion {self.name}={self.version}>'
+
+class Job(db.Model):
+    """Background job (see jobs.py); params and result are JSON text"""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded, failed, cancelled
+    params = db.Column(db.Text)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    message = db.Column(db.String(300))
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    created_by_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+
+    # The runner polls for the oldest queued job
+    __table_args__ = (
+        db.Index('ix_job_status_id', 'status', 'id'),
+    )
+
+    FINISHED = ('succeeded', 'failed', 'cancelled')
+
+    @property
+    def is_finished(self):
+        return self.status in self.FINISHED
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'params': json.loads(self.params) if self.params else None,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'progress': self.progress,
+            'total': self.total,
+            'message': self.message,
+            'cancel_requested': self.cancel_requested,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
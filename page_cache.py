@@ -0,0 +1,112 @@
+"""
+Full-page cache for anonymous catalogue requests.
+For logged-out visitors the home page and hotel listing depend only on the
+query-string filters and the catalogue, so rendered HTML is cached under the
+endpoint, the normalized filters and the catalogue version. A write to hotels,
+cities or categories bumps that version, which makes every older entry
+unreachable; the backend is emptied the first time a new version is seen.
+
+PAGE_CACHE_BACKEND selects 'memory' (LRU per worker), 'filesystem' (a
+directory shared by the workers on a host, PAGE_CACHE_DIR) or 'none'.
+"""
+
+import os
+import tempfile
+import threading
+from functools import wraps
+from flask import make_response, request, session
+from flask_login import current_user
+from app import app
+from cache import LRUCache, FileSystemCache
+from catalogue import catalogue_version
+
+app.config.setdefault("PAGE_CACHE_BACKEND", "memory")
+app.config.setdefault("PAGE_CACHE_MAX_BYTES", 32 * 1024 * 1024)
+app.config.setdefault("PAGE_CACHE_TTL", 300)
+app.config.setdefault("PAGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "hotel-page-cache"))
+
+# Query parameters that change a catalogue page, with how to parse them.
+# Anything else (tracking parameters and the like) is left out of the key.
+FILTER_PARAMS = {
+    'search': lambda value: ' '.join(value.split()) or None,
+    'city_id': int,
+    'category_id': int,
+    'min_price': float,
+    'max_price': float,
+    'min_rating': float,
+}
+CURSOR_PARAMS = ('after', 'before')
+
+_lock = threading.Lock()
+_state = {'backend': None, 'version': None}
+
+
+def normalized_filters(args):
+    """Known filters from ``args`` in canonical string form, dropping empty or invalid values"""
+    filters = {}
+    for name, parse in FILTER_PARAMS.items():
+        value = args.get(name)
+        if not value:
+            continue
+        try:
+            parsed = parse(value)
+        except ValueError:
+            continue
+        if parsed is not None:
+            filters[name] = str(parsed)
+    return filters
+
+
+def page_key(version):
+    """Cache key for the current request at a catalogue version"""
+    parts = [f'{name}={value}' for name, value in sorted(normalized_filters(request.args).items())]
+    parts += [f'{name}={request.args[name]}' for name in CURSOR_PARAMS if request.args.get(name)]
+    return f"{app.config['ETAG_SALT']}:{version}:{request.endpoint}?{'&'.join(parts)}"
+
+
+def get_backend():
+    """The configured cache backend, created on first use (None when disabled)"""
+    if _state['backend'] is None:
+        kind = app.config['PAGE_CACHE_BACKEND']
+        with _lock:
+            if _state['backend'] is None and kind != 'none':
+                if kind == 'filesystem':
+                    _state['backend'] = FileSystemCache(app.config['PAGE_CACHE_DIR'],
+                                                        app.config['PAGE_CACHE_MAX_BYTES'])
+                else:
+                    _state['backend'] = LRUCache(app.config['PAGE_CACHE_MAX_BYTES'])
+    return _state['backend']
+
+
+def page_cache_stats():
+    """Hit/miss/eviction counters and size of the page cache"""
+    backend = get_backend()
+    return backend.stats() if backend is not None else {}
+
+
+def cached_page(f):
+    """Decorator serving anonymous GET requests from the page cache"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        backend = get_backend()
+        if backend is None or current_user.is_authenticated or session.get('_flashes'):
+            return f(*args, **kwargs)
+
+        version, _ = catalogue_version()
+        if version != _state['version']:
+            backend.clear()
+            _state['version'] = version
+
+        key = page_key(version)
+        body = backend.get(key)
+        if body is not None:
+            response = make_response(body)
+            response.headers['X-Cache'] = 'HIT'
+            return response
+
+        response = make_response(f(*args, **kwargs))
+        if response.status_code == 200 and response.mimetype == 'text/html':
+            backend.set(key, response.get_data(), app.config['PAGE_CACHE_TTL'])
+        response.headers['X-Cache'] = 'MISS'
+        return response
+    return decorated_function
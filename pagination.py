@@ -0,0 +1,133 @@
+"""
+Keyset (cursor) pagination for hotel listings.
+Pages are addressed by the (rating, id) of their boundary rows (or another
+numeric sort column, such as id alone for the admin list) instead of an
+OFFSET, so every page touches at most ``per_page + 1`` rows whatever the size
+of the catalogue.
+"""
+
+import base64
+import json
+from sqlalchemy import and_, or_
+from models import Hotel
+
+
+class KeysetPage:
+    """One page of hotels plus the cursors needed to move around it"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_key(key):
+    """Encode a (score, id) sort key as an opaque URL-safe token"""
+    payload = json.dumps(list(key), separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def encode_cursor(hotel, sort=Hotel.rating):
+    """Encode the sort key of a hotel as an opaque URL-safe token"""
+    return encode_key((getattr(hotel, sort.key) or 0.0, hotel.id))
+
+
+def decode_cursor(token):
+    """Decode a cursor token, returning (score, id) or None if it is invalid"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        score, hotel_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(score), int(hotel_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def paginate_hotels(query, after=None, before=None, per_page=20, sort=Hotel.rating):
+    """Return a KeysetPage of ``query`` ordered by ``sort`` desc, id desc.
+
+    ``sort`` is a numeric Hotel column. ``after`` moves forward from a
+    next-cursor, ``before`` moves backward from a prev-cursor. Invalid cursors
+    fall back to the first page.
+    """
+    after_key = decode_cursor(after)
+    before_key = decode_cursor(before)
+
+    if before_key and not after_key:
+        value, hotel_id = before_key
+        rows = (query.filter(or_(sort > value,
+                                 and_(sort == value, Hotel.id > hotel_id)))
+                .order_by(sort.asc(), Hotel.id.asc())
+                .limit(per_page + 1)
+                .all())
+        has_prev = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        return KeysetPage(
+            items,
+            next_cursor=encode_cursor(items[-1], sort) if items else None,
+            prev_cursor=encode_cursor(items[0], sort) if has_prev else None,
+        )
+
+    if after_key:
+        value, hotel_id = after_key
+        query = query.filter(or_(sort < value,
+                                 and_(sort == value, Hotel.id < hotel_id)))
+
+    rows = query.order_by(sort.desc(), Hotel.id.desc()).limit(per_page + 1).all()
+    has_next = len(rows) > per_page
+    items = rows[:per_page]
+    return KeysetPage(
+        items,
+        next_cursor=encode_cursor(items[-1], sort) if has_next else None,
+        prev_cursor=encode_cursor(items[0], sort) if after_key and items else None,
+    )
+
+
+def paginate_ranked(query, ranking, after=None, before=None, per_page=20):
+    """Return a KeysetPage of ``query`` in the order of a search ranking.
+
+    ``ranking`` is a list of (hotel_id, score) pairs sorted by score desc,
+    id desc, as returned by search.search_hotels. Only hotels that also match
+    ``query`` are kept, and cursors carry the (score, id) of the boundary rows.
+    """
+    hotel_ids = [hotel_id for hotel_id, _ in ranking]
+    if not hotel_ids:
+        return KeysetPage([])
+    matching = {hotel_id for (hotel_id,) in
+                query.with_entities(Hotel.id).filter(Hotel.id.in_(hotel_ids))}
+    keys = [(score, hotel_id) for hotel_id, score in ranking if hotel_id in matching]
+
+    after_key = decode_cursor(after)
+    before_key = decode_cursor(before)
+    if before_key and not after_key:
+        end = next((i for i, key in enumerate(keys) if key <= before_key), len(keys))
+        start = max(end - per_page, 0)
+    else:
+        start = 0
+        if after_key:
+            start = next((i for i, key in enumerate(keys) if key < after_key), len(keys))
+        end = start + per_page
+    window = keys[start:end]
+
+    hotels = {hotel.id: hotel for hotel in
+              query.filter(Hotel.id.in_([hotel_id for _, hotel_id in window]))}
+    return KeysetPage(
+        [hotels[hotel_id] for _, hotel_id in window if hotel_id in hotels],
+        next_cursor=encode_key(window[-1]) if window and end < len(keys) else None,
+        prev_cursor=encode_key(window[0]) if window and start > 0 else None,
+    )
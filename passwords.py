@@ -0,0 +1,86 @@
+"""
+Password hashing off the request thread.
+Hashes use PASSWORD_HASH_METHOD, any method string werkzeug.security accepts
+('scrypt', 'scrypt:16384:8:1', 'pbkdf2:sha256:600000', ...). A hash made with
+other parameters still verifies, and auth.login replaces it on the user's
+next successful login.
+
+Hashing and verification run on a bounded pool so a burst of logins cannot
+occupy every CPU a worker has. PASSWORD_HASH_POOL is 'thread' (hashlib's
+scrypt and pbkdf2 release the GIL), 'process' or 'none' (inline, as before),
+with PASSWORD_HASH_WORKERS workers. At most PASSWORD_HASH_QUEUE further
+requests wait, each for up to PASSWORD_HASH_WAIT seconds, before
+PasswordHashingBusy is raised.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+from app import app
+
+app.config.setdefault("PASSWORD_HASH_METHOD", os.environ.get("PASSWORD_HASH_METHOD", "scrypt"))
+app.config.setdefault("PASSWORD_HASH_POOL", os.environ.get("PASSWORD_HASH_POOL", "thread"))
+app.config.setdefault("PASSWORD_HASH_WORKERS", int(os.environ.get("PASSWORD_HASH_WORKERS", 1)))
+app.config.setdefault("PASSWORD_HASH_QUEUE", int(os.environ.get("PASSWORD_HASH_QUEUE", 8)))
+app.config.setdefault("PASSWORD_HASH_WAIT", 5.0)
+
+
+class PasswordHashingBusy(Exception):
+    """Too many hashes are already running or waiting"""
+
+
+_lock = threading.Lock()
+_pool = {}  # executor and slots
+
+
+def _executor():
+    with _lock:
+        if 'executor' not in _pool:
+            workers = app.config['PASSWORD_HASH_WORKERS']
+            if app.config['PASSWORD_HASH_POOL'] == 'process':
+                # spawn: forking a process that runs threads can copy held locks
+                _pool['executor'] = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+            else:
+                _pool['executor'] = ThreadPoolExecutor(workers, thread_name_prefix='password-hash')
+            _pool['slots'] = threading.BoundedSemaphore(workers + app.config['PASSWORD_HASH_QUEUE'])
+        return _pool['executor'], _pool['slots']
+
+
+def _run(function, *args):
+    if app.config['PASSWORD_HASH_POOL'] == 'none':
+        return function(*args)
+    executor, slots = _executor()
+    if not slots.acquire(timeout=app.config['PASSWORD_HASH_WAIT']):
+        raise PasswordHashingBusy()
+    try:
+        return executor.submit(function, *args).result()
+    finally:
+        slots.release()
+
+
+def hash_password(password):
+    """Hash ``password`` with PASSWORD_HASH_METHOD"""
+    return _run(generate_password_hash, password, app.config['PASSWORD_HASH_METHOD'])
+
+
+def verify_password(password_hash, password):
+    """Check ``password`` against a stored hash"""
+    return _run(check_password_hash, password_hash, password)
+
+
+def _method_prefix(method):
+    """``method`` with werkzeug's defaults filled in, as stored before the
+    first '$' of a hash ('scrypt' -> 'scrypt:32768:8:1'), without hashing"""
+    name, *args = method.split(':')
+    if name == 'scrypt' and not args:
+        return 'scrypt:32768:8:1'
+    if name == 'pbkdf2' and len(args) < 2:
+        return f"pbkdf2:{args[0] if args else 'sha256'}:{DEFAULT_PBKDF2_ITERATIONS}"
+    return method
+
+
+def needs_rehash(password_hash):
+    """Whether a stored hash was made with other parameters than PASSWORD_HASH_METHOD"""
+    return password_hash.split('$', 1)[0] != _method_prefix(app.config['PASSWORD_HASH_METHOD'])
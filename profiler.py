@@ -0,0 +1,134 @@
+"""
+On-demand request profiling for admins.
+A request from a logged-in admin carrying ?_profile=1 or an "X-Profile: 1"
+header runs under cProfile. The profile is written to PROFILER_DIR as a
+pstats file (open it with `python -m pstats`, snakeviz and the like) next to
+a JSON summary of the route, duration and top hotspots. Only the newest
+PROFILER_MAX_PROFILES are kept. /admin/profiles lists them.
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import re
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from flask import g, request
+from flask_login import current_user
+from app import app
+
+app.config.setdefault("PROFILER_ENABLED", True)
+app.config.setdefault("PROFILER_DIR", os.path.join(tempfile.gettempdir(), "hotel-profiles"))
+app.config.setdefault("PROFILER_MAX_PROFILES", 50)
+
+PROFILE_ID_RE = re.compile(r'^\d{20}-[0-9a-f]{8}$')
+HOTSPOTS = 15
+
+
+def profiling_requested():
+    """True when the current request asks to be profiled by an admin"""
+    if not app.config['PROFILER_ENABLED']:
+        return False
+    if request.args.get('_profile') != '1' and request.headers.get('X-Profile') != '1':
+        return False
+    return current_user.is_authenticated and current_user.is_admin
+
+
+@app.before_request
+def _start_profile():
+    if profiling_requested():
+        g.profile_started = time.perf_counter()
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+@app.after_request
+def _finish_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    profiler.disable()
+    duration_ms = (time.perf_counter() - g.pop('profile_started')) * 1000
+    response.headers['X-Profile-Id'] = save_profile(profiler, response.status_code, duration_ms)
+    return response
+
+
+def hotspots(stats, limit=HOTSPOTS):
+    """Top functions by own time: name, location, calls, own and cumulative ms"""
+    rows = []
+    for (filename, line, function), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        if filename.startswith(app.root_path):
+            filename = os.path.relpath(filename, app.root_path)
+        rows.append({
+            'function': function,
+            'location': f'{filename}:{line}',
+            'calls': calls,
+            'own_ms': round(tottime * 1000, 3),
+            'cumulative_ms': round(cumtime * 1000, 3),
+        })
+    rows.sort(key=lambda row: row['own_ms'], reverse=True)
+    return rows[:limit]
+
+
+def save_profile(profiler, status, duration_ms):
+    """Store a finished profile and its summary; returns the profile id"""
+    directory = app.config['PROFILER_DIR']
+    os.makedirs(directory, exist_ok=True)
+    now = datetime.utcnow()
+    profile_id = f"{now:%Y%m%d%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+    stats = pstats.Stats(profiler)
+    stats.dump_stats(os.path.join(directory, f'{profile_id}.prof'))
+    summary = {
+        'id': profile_id,
+        'created_at': now.isoformat(),
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'status': status,
+        'duration_ms': round(duration_ms, 1),
+        'user': current_user.username,
+        'hotspots': hotspots(stats),
+    }
+    with open(os.path.join(directory, f'{profile_id}.json'), 'w') as f:
+        json.dump(summary, f)
+    _trim(directory)
+    return profile_id
+
+
+def _trim(directory):
+    """Delete the oldest profiles beyond PROFILER_MAX_PROFILES"""
+    ids = sorted(name[:-5] for name in os.listdir(directory) if name.endswith('.json'))
+    for profile_id in ids[:-app.config['PROFILER_MAX_PROFILES']]:
+        for extension in ('.json', '.prof'):
+            try:
+                os.remove(os.path.join(directory, profile_id + extension))
+            except OSError:
+                pass
+
+
+def recent_profiles():
+    """Summaries of the stored profiles, newest first"""
+    directory = app.config['PROFILER_DIR']
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def profile_path(profile_id):
+    """Path of a stored pstats file, or None for unknown or malformed ids"""
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    path = os.path.join(app.config['PROFILER_DIR'], f'{profile_id}.prof')
+    return path if os.path.exists(path) else None
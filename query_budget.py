@@ -0,0 +1,50 @@
+"""
+SQL query budgets for listing routes.
+Every statement run during a request is counted. Routes decorated with
+@query_budget(n) log a warning when they issue more than n queries, or fail
+with QueryBudgetExceeded when QUERY_BUDGET_STRICT is set, which catches
+lazy loads creeping back into templates (N+1 queries).
+"""
+
+import logging
+from functools import wraps
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import app
+
+app.config.setdefault("QUERY_BUDGET_STRICT", False)
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised in strict mode when a route issues more queries than its budget"""
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+
+def query_count():
+    """Number of SQL statements issued so far in the current request"""
+    return g.get('query_count', 0)
+
+
+def query_budget(limit):
+    """Decorator capping the number of SQL queries a route may issue"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            response = f(*args, **kwargs)
+            count = query_count()
+            if count > limit:
+                message = f'{request.endpoint} issued {count} queries (budget {limit})'
+                if app.config['QUERY_BUDGET_STRICT']:
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+            return response
+        return decorated_function
+    return decorator
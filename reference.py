@@ -0,0 +1,104 @@
+"""
+Cached reference data: cities and hotel categories.
+These lists fill search dropdowns and admin form choices on hot pages but
+almost never change. Each worker keeps its own copy, tagged with the
+'reference' DataVersion it was loaded at. The stored version is re-read at
+most every DATA_VERSION_CHECK_INTERVAL seconds and the copy is reloaded when
+another worker bumped it, or after REFERENCE_CACHE_TTL seconds regardless.
+"""
+
+import threading
+import time
+from sqlalchemy import select
+from app import app, db
+from models import City, HotelCategory, DataVersion
+from catalogue import bump_catalogue_version
+
+app.config.setdefault("REFERENCE_CACHE_TTL", 300)
+app.config.setdefault("DATA_VERSION_CHECK_INTERVAL", 5)
+
+REFERENCE_VERSION = 'reference'
+
+
+class VersionedCache:
+    """Per-worker cache of one value tied to a DataVersion counter"""
+
+    def __init__(self, version_name, factory):
+        self.version_name = version_name
+        self.factory = factory
+        self._lock = threading.Lock()
+        self._value = None
+        self._version = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+
+    def get(self):
+        """Return the cached value, reloading it if stale"""
+        now = time.monotonic()
+        if self._version is not None:
+            if now - self._loaded_at > app.config['REFERENCE_CACHE_TTL']:
+                return self._reload(now)
+            if now - self._checked_at < app.config['DATA_VERSION_CHECK_INTERVAL']:
+                return self._value
+            version = DataVersion.current(self.version_name)
+            if version == self._version:
+                self._checked_at = now
+                return self._value
+            return self._reload(now, version)
+        return self._reload(now)
+
+    def invalidate(self):
+        """Drop this worker's copy so the next get() reloads it"""
+        with self._lock:
+            self._version = None
+
+    def _reload(self, now, version=None):
+        if version is None:
+            version = DataVersion.current(self.version_name)
+        value = self.factory()
+        with self._lock:
+            self._value, self._version = value, version
+            self._loaded_at = self._checked_at = now
+        return value
+
+
+def _load_reference_data():
+    # Plain rows rather than ORM objects so they can outlive the session
+    return {
+        'cities': db.session.execute(
+            select(City.id, City.name, City.country).order_by(City.name)).all(),
+        'categories': db.session.execute(
+            select(HotelCategory.id, HotelCategory.name, HotelCategory.description)
+            .order_by(HotelCategory.name)).all(),
+    }
+
+
+_reference_cache = VersionedCache(REFERENCE_VERSION, _load_reference_data)
+
+
+def get_cities():
+    """All cities as (id, name, country) rows, ordered by name"""
+    return _reference_cache.get()['cities']
+
+
+def get_categories():
+    """All hotel categories as (id, name, description) rows, ordered by name"""
+    return _reference_cache.get()['categories']
+
+
+def city_choices():
+    """SelectField choices for cities"""
+    return [(c.id, c.name) for c in get_cities()]
+
+
+def category_choices():
+    """SelectField choices for hotel categories"""
+    return [(c.id, c.name) for c in get_categories()]
+
+
+def invalidate_reference_data():
+    """Bump the shared versions after cities or categories were committed"""
+    DataVersion.bump(REFERENCE_VERSION)
+    bump_catalogue_version(commit=False)
+    db.session.commit()
+    _reference_cache.invalidate()
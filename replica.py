@@ -0,0 +1,69 @@
+"""
+Read-replica routing.
+With DATABASE_REPLICA_URL set, views decorated with @read_replica send their
+plain SELECTs to the replica (see RoutingSession in app.py). Flushes, other
+statements and every undecorated view use the primary.
+
+Replicas lag, so a commit that wrote anything sends reads back to the
+primary for REPLICA_READ_YOUR_WRITES seconds: for the browser session that
+committed (so an admin sees their own change on the next page, whichever
+worker serves it) and for the whole process (so pages cached in this process
+are never built from data older than the catalogue version it just bumped).
+"""
+
+import time
+from functools import wraps
+from flask import g, has_request_context, session as browser_session
+from sqlalchemy import event
+from app import app, RoutingSession
+
+app.config.setdefault("REPLICA_READ_YOUR_WRITES", 10)
+
+_primary_until = [0.0]
+
+
+def replica_configured():
+    return 'replica' in app.config.get('SQLALCHEMY_BINDS', {})
+
+
+def use_replica():
+    """Whether the current request's reads may go to the replica"""
+    now = time.time()
+    return replica_configured() and now >= _primary_until[0] and now >= browser_session.get('primary_until', 0)
+
+
+def read_replica(f):
+    """Route the view's reads to the replica, outside read-your-writes windows"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.use_replica = use_replica()
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _flushed(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _executed(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _committed(session):
+    if not session.info.pop('wrote', False) or not replica_configured():
+        return
+    until = time.time() + app.config['REPLICA_READ_YOUR_WRITES']
+    _primary_until[0] = until
+    if has_request_context():
+        browser_session['primary_until'] = until
+        # Later reads in this request see the write too
+        g.use_replica = False
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _rolled_back(session):
+    session.info.pop('wrote', None)
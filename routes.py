@@ -1,13 +1,33 @@
-from flask import render_template, request, redirect, url_for, flash, jsonify
+from flask import render_template, request, redirect, url_for, flash, jsonify, abort, send_file
 from flask_login import login_required, current_user
+from sqlalchemy.exc import IntegrityError
 from app import app, db
-from models import User, City, HotelCategory, Hotel
+from constraints import delete_unreferenced, taken_values
+from models import User, City, HotelCategory, Hotel, Job
 from auth import auth_bp
+from api import api_bp
+from metrics import metrics_bp
+from passwords import PasswordHashingBusy
 from forms import HotelSearchForm, AdminHotelForm, AdminCityForm, AdminCategoryForm, AdminUserForm, AdminEditUserForm
+from search import hotel_search_params, search_page
+from pagination import paginate_hotels
+from query_budget import query_budget
+from replica import read_replica
+import instrumentation  # noqa: F401
+import logs  # noqa: F401
+import profiler
+from stats import get_dashboard_stats, invalidate_dashboard_stats
+from user_cache import invalidate_user
+from catalogue import conditional_get, bump_catalogue_version
+from page_cache import cached_page, normalized_filters
+from reference import get_cities, get_categories, city_choices, category_choices, invalidate_reference_data
+import jobs
 import json
 
-# Register auth blueprint
+# Register blueprints
 app.register_blueprint(auth_bp, url_prefix='/auth')
+app.register_blueprint(api_bp, url_prefix='/api')
+app.register_blueprint(metrics_bp)
 
 def admin_required(f):
     """Decorator to require admin access"""
@@ -20,89 +40,69 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def flash_taken_user_fields(form, exclude_id=None):
+    """Flash which of the submitted username and email another user already has"""
+    taken = taken_values(User, exclude_id, username=form.username.data, email=form.email.data)
+    if 'username' in taken:
+        flash('Username already exists', 'danger')
+    if 'email' in taken:
+        flash('Email already exists', 'danger')
+    if not taken:
+        # Someone else took and released it between the write and the check
+        flash('User could not be saved, please try again', 'danger')
+
 @app.route('/')
+@read_replica
+@query_budget(5)
+@conditional_get
+@cached_page
 def index():
     """Home page"""
     if current_user.is_authenticated and current_user.is_admin:
         return redirect(url_for('admin_dashboard'))
     
     # Get featured hotels for display
-    featured_hotels = Hotel.query.filter_by(is_available=True).order_by(Hotel.rating.desc()).limit(6).all()
-    cities = City.query.all()
+    featured_hotels = Hotel.with_relations().filter_by(is_available=True).order_by(Hotel.rating.desc()).limit(6).all()
+    cities = get_cities()
     return render_template('index.html', featured_hotels=featured_hotels, cities=cities)
 
 @app.route('/hotels')
+@read_replica
+@query_budget(8)
+@conditional_get
+@cached_page
 def hotels():
     """Hotel listing page with search and filtering"""
     form = HotelSearchForm()
     
-    # Get query parameters
-    search = request.args.get('search', '')
-    city_id = request.args.get('city_id', type=int)
-    category_id = request.args.get('category_id', type=int)
-    min_price = request.args.get('min_price', type=float)
-    max_price = request.args.get('max_price', type=float)
-    min_rating = request.args.get('min_rating', type=float)
-    
-    # Build query
-    query = Hotel.query.filter_by(is_available=True)
+    params = hotel_search_params(request.args)
+    page = search_page(Hotel.with_relations(), params,
+                       after=request.args.get('after'),
+                       before=request.args.get('before'),
+                       per_page=app.config['HOTELS_PER_PAGE'])
+    cities = get_cities()
+    categories = get_categories()
     
-    if search:
-        query = query.filter(Hotel.name.contains(search))
-    if city_id:
-        query = query.filter_by(city_id=city_id)
-    if category_id:
-        query = query.filter_by(category_id=category_id)
-    if min_price:
-        query = query.filter(Hotel.price_per_night >= min_price)
-    if max_price:
-        query = query.filter(Hotel.price_per_night <= max_price)
-    if min_rating:
-        query = query.filter(Hotel.rating >= min_rating)
-    
-    hotels = query.order_by(Hotel.rating.desc()).all()
-    cities = City.query.all()
-    categories = HotelCategory.query.all()
+    # Filters carried over to the next/prev links
+    filters = normalized_filters(request.args)
     
     return render_template('hotels.html', 
-                         hotels=hotels, 
+                         hotels=page.items, 
+                         page=page,
+                         filters=filters,
                          cities=cities, 
                          categories=categories,
                          form=form,
-                         search=search,
-                         city_id=city_id,
-                         category_id=category_id,
-                         min_price=min_price,
-                         max_price=max_price,
-                         min_rating=min_rating)
+                         **params)
 
 @app.route('/admin')
+@read_replica
+@query_budget(3)
 @login_required
 @admin_required
 def admin_dashboard():
     """Admin dashboard with statistics"""
-    stats = {
-        'total_users': User.query.count(),
-        'total_hotels': Hotel.query.count(),
-        'total_cities': City.query.count(),
-        'total_categories': HotelCategory.query.count(),
-        'available_hotels': Hotel.query.filter_by(is_available=True).count(),
-    }
-    
-    # Get recent hotels
-    recent_hotels = Hotel.query.order_by(Hotel.created_at.desc()).limit(5).all()
-    
-    # Get city distribution data
-    city_data = db.session.query(City.name, db.func.count(Hotel.id)).join(Hotel).group_by(City.name).all()
-    
-    # Get category distribution data
-    category_data = db.session.query(HotelCategory.name, db.func.count(Hotel.id)).join(Hotel).group_by(HotelCategory.name).all()
-    
-    return render_template('admin/dashboard.html', 
-                         stats=stats, 
-                         recent_hotels=recent_hotels,
-                         city_data=city_data,
-                         category_data=category_data)
+    return render_template('admin/dashboard.html', **get_dashboard_stats())
 
 @app.route('/admin/users')
 @login_required
@@ -120,22 +120,25 @@ def admin_create_user():
     """Create new user"""
     form = AdminUserForm()
     if form.validate_on_submit():
-        # Check if user already exists
-        if User.query.filter_by(username=form.username.data).first():
-            flash('Username already exists', 'danger')
-            return redirect(url_for('admin_users'))
-        if User.query.filter_by(email=form.email.data).first():
-            flash('Email already exists', 'danger')
-            return redirect(url_for('admin_users'))
-        
         user = User(
             username=form.username.data,
             email=form.email.data,
             is_admin=form.is_admin.data
         )
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except PasswordHashingBusy:
+            flash('The server is busy. Please try again in a moment.', 'warning')
+            return admin_users(), 503, {'Retry-After': '5'}
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            flash_taken_user_fields(form)
+            return redirect(url_for('admin_users'))
+        invalidate_user(user.id)
+        invalidate_dashboard_stats()
         flash('User created successfully', 'success')
     else:
         for field, errors in form.errors.items():
@@ -152,24 +155,24 @@ def admin_edit_user(user_id):
     form = AdminEditUserForm(obj=user)
     
     if form.validate_on_submit():
-        # Check if username/email already exists for other users
-        existing_username = User.query.filter(User.username == form.username.data, User.id != user_id).first()
-        existing_email = User.query.filter(User.email == form.email.data, User.id != user_id).first()
-        
-        if existing_username:
-            flash('Username already exists', 'danger')
-            return render_template('admin/edit_user.html', form=form, user=user)
-        if existing_email:
-            flash('Email already exists', 'danger')
-            return render_template('admin/edit_user.html', form=form, user=user)
-        
         user.username = form.username.data
         user.email = form.email.data
         user.is_admin = form.is_admin.data
         if form.password.data:
-            user.set_password(form.password.data)
+            try:
+                user.set_password(form.password.data)
+            except PasswordHashingBusy:
+                db.session.rollback()
+                flash('The server is busy. Please try again in a moment.', 'warning')
+                return render_template('admin/edit_user.html', form=form, user=user), 503, {'Retry-After': '5'}
         
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            flash_taken_user_fields(form, exclude_id=user_id)
+            return render_template('admin/edit_user.html', form=form, user=user)
+        invalidate_user(user.id)
         flash('User updated successfully', 'success')
         return redirect(url_for('admin_users'))
     
@@ -185,8 +188,12 @@ def admin_delete_user(user_id):
         flash('Cannot delete your own account', 'danger')
         return redirect(url_for('admin_users'))
     
+    # Keep the user's jobs; tables created before ondelete='SET NULL' lack it
+    Job.query.filter_by(created_by_id=user_id).update({Job.created_by_id: None}, synchronize_session=False)
     db.session.delete(user)
     db.session.commit()
+    invalidate_user(user_id)
+    invalidate_dashboard_stats()
     flash('User deleted successfully', 'success')
     return redirect(url_for('admin_users'))
 
@@ -194,7 +201,7 @@ def admin_delete_user(user_id):
 @login_required
 @admin_required
 def admin_scrape_hotels():
-    """Scrape hotels from Booking.com"""
+    """Queue a scrape or generation job and list recent jobs"""
     if request.method == 'POST':
         cities = request.form.get('cities', '').split(',')
         cities = [city.strip() for city in cities if city.strip()]
@@ -202,19 +209,56 @@ def admin_scrape_hotels():
         
         if not cities:
             flash('Please enter at least one city name', 'danger')
-            return render_template('admin/scrape.html')
-        
-        try:
-            # First try the hotel generator for reliable data
-            from hotel_generator import generate_hotels_for_morocco
-            total_hotels = generate_hotels_for_morocco(cities, limit)
-            flash(f'Successfully generated {total_hotels} realistic hotels for {len(cities)} cities', 'success')
-        except Exception as e:
-            flash(f'Error generating hotel data: {str(e)}', 'danger')
+            return redirect(url_for('admin_scrape_hotels'))
         
+        if request.form.get('source') == 'generate':
+            job = jobs.enqueue('generate', {'cities': cities, 'hotels_per_city': limit}, user_id=current_user.id)
+        else:
+            job = jobs.enqueue('scrape', {'cities': cities, 'limit_per_city': limit}, user_id=current_user.id)
+        flash(f'Job #{job.id} queued for {len(cities)} cities', 'success')
         return redirect(url_for('admin_scrape_hotels'))
     
-    return render_template('admin/scrape.html')
+    recent_jobs = Job.query.order_by(Job.id.desc()).limit(10).all()
+    return render_template('admin/scrape.html', jobs=recent_jobs)
+
+@app.route('/admin/jobs/<int:job_id>')
+@login_required
+@admin_required
+def admin_job_status(job_id):
+    """Job status and progress as JSON, for polling"""
+    job = Job.query.get_or_404(job_id)
+    return jsonify(job.to_dict())
+
+@app.route('/admin/jobs/<int:job_id>/cancel', methods=['POST'])
+@login_required
+@admin_required
+def admin_cancel_job(job_id):
+    """Cancel a queued or running job"""
+    Job.query.get_or_404(job_id)
+    if jobs.cancel(job_id):
+        flash(f'Job #{job_id} cancelled', 'success')
+    else:
+        flash(f'Job #{job_id} has already finished', 'warning')
+    return redirect(url_for('admin_scrape_hotels'))
+
+@app.route('/admin/profiles')
+@login_required
+@admin_required
+def admin_profiles():
+    """Recently profiled requests with their hotspots"""
+    return render_template('admin/profiles.html', profiles=profiler.recent_profiles(),
+                           max_profiles=app.config['PROFILER_MAX_PROFILES'])
+
+@app.route('/admin/profiles/<profile_id>.prof')
+@login_required
+@admin_required
+def admin_download_profile(profile_id):
+    """Download a stored profile in pstats format"""
+    path = profiler.profile_path(profile_id)
+    if path is None:
+        abort(404)
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f'{profile_id}.prof')
 
 @app.route('/admin/cities')
 @login_required
@@ -232,13 +276,17 @@ def admin_create_city():
     """Create new city"""
     form = AdminCityForm()
     if form.validate_on_submit():
-        if City.query.filter_by(name=form.name.data).first():
-            flash('City already exists', 'danger')
-            return redirect(url_for('admin_cities'))
-        
         city = City(name=form.name.data, country=form.country.data)
         db.session.add(city)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # name is the only unique column
+            db.session.rollback()
+            flash('City already exists', 'danger')
+            return redirect(url_for('admin_cities'))
+        invalidate_dashboard_stats()
+        invalidate_reference_data()
         flash('City created successfully', 'success')
     else:
         for field, errors in form.errors.items():
@@ -251,13 +299,16 @@ def admin_create_city():
 @admin_required
 def admin_delete_city(city_id):
     """Delete city"""
-    city = City.query.get_or_404(city_id)
-    if city.hotels:
+    deleted = delete_unreferenced(City, city_id, Hotel.city_id)
+    if deleted is None:
+        abort(404)
+    if not deleted:
         flash('Cannot delete city with associated hotels', 'danger')
         return redirect(url_for('admin_cities'))
     
-    db.session.delete(city)
     db.session.commit()
+    invalidate_dashboard_stats()
+    invalidate_reference_data()
     flash('City deleted successfully', 'success')
     return redirect(url_for('admin_cities'))
 
@@ -277,13 +328,17 @@ def admin_create_category():
     """Create new category"""
     form = AdminCategoryForm()
     if form.validate_on_submit():
-        if HotelCategory.query.filter_by(name=form.name.data).first():
-            flash('Category already exists', 'danger')
-            return redirect(url_for('admin_categories'))
-        
         category = HotelCategory(name=form.name.data, description=form.description.data)
         db.session.add(category)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # name is the only unique column
+            db.session.rollback()
+            flash('Category already exists', 'danger')
+            return redirect(url_for('admin_categories'))
+        invalidate_dashboard_stats()
+        invalidate_reference_data()
         flash('Category created successfully', 'success')
     else:
         for field, errors in form.errors.items():
@@ -296,26 +351,35 @@ def admin_create_category():
 @admin_required
 def admin_delete_category(category_id):
     """Delete category"""
-    category = HotelCategory.query.get_or_404(category_id)
-    if category.hotels:
+    deleted = delete_unreferenced(HotelCategory, category_id, Hotel.category_id)
+    if deleted is None:
+        abort(404)
+    if not deleted:
         flash('Cannot delete category with associated hotels', 'danger')
         return redirect(url_for('admin_categories'))
     
-    db.session.delete(category)
     db.session.commit()
+    invalidate_dashboard_stats()
+    invalidate_reference_data()
     flash('Category deleted successfully', 'success')
     return redirect(url_for('admin_categories'))
 
 @app.route('/admin/hotels')
+@query_budget(5)
 @login_required
 @admin_required
 def admin_hotels():
     """Admin hotels management"""
-    hotels = Hotel.query.order_by(Hotel.created_at.desc()).all()
+    # Newest first: ids follow creation order
+    page = paginate_hotels(Hotel.with_relations(),
+                           after=request.args.get('after'),
+                           before=request.args.get('before'),
+                           per_page=app.config['ADMIN_HOTELS_PER_PAGE'],
+                           sort=Hotel.id)
     form = AdminHotelForm()
-    form.city_id.choices = [(c.id, c.name) for c in City.query.all()]
-    form.category_id.choices = [(c.id, c.name) for c in HotelCategory.query.all()]
-    return render_template('admin/hotels.html', hotels=hotels, form=form)
+    form.city_id.choices = city_choices()
+    form.category_id.choices = category_choices()
+    return render_template('admin/hotels.html', hotels=page.items, page=page, form=form)
 
 @app.route('/admin/hotels/create', methods=['POST'])
 @login_required
@@ -323,8 +387,8 @@ def admin_hotels():
 def admin_create_hotel():
     """Create new hotel"""
     form = AdminHotelForm()
-    form.city_id.choices = [(c.id, c.name) for c in City.query.all()]
-    form.category_id.choices = [(c.id, c.name) for c in HotelCategory.query.all()]
+    form.city_id.choices = city_choices()
+    form.category_id.choices = category_choices()
     
     if form.validate_on_submit():
         hotel = Hotel(
@@ -340,7 +404,15 @@ def admin_create_hotel():
             category_id=form.category_id.data
         )
         db.session.add(hotel)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # uq_hotel_name_city
+            db.session.rollback()
+            flash('A hotel with this name already exists in this city', 'danger')
+            return redirect(url_for('admin_hotels'))
+        invalidate_dashboard_stats()
+        bump_catalogue_version()
         flash('Hotel created successfully', 'success')
     else:
         for field, errors in form.errors.items():
@@ -356,6 +428,8 @@ def admin_delete_hotel(hotel_id):
     hotel = Hotel.query.get_or_404(hotel_id)
     db.session.delete(hotel)
     db.session.commit()
+    invalidate_dashboard_stats()
+    bump_catalogue_version()
     flash('Hotel deleted successfully', 'success')
     return redirect(url_for('admin_hotels'))
 
@@ -367,6 +441,8 @@ def admin_toggle_hotel_availability(hotel_id):
     hotel = Hotel.query.get_or_404(hotel_id)
     hotel.is_available = not hotel.is_available
     db.session.commit()
+    invalidate_dashboard_stats()
+    bump_catalogue_version()
     status = 'available' if hotel.is_available else 'unavailable'
     flash(f'Hotel marked as {status}', 'success')
     return redirect(url_for('admin_hotels'))
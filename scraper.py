@@ -4,49 +4,152 @@ This script generates realistic hotel data for Moroccan cities using various sou
 Since direct scraping may be blocked, this creates realistic sample data.
 """
 
-import requests
-from bs4 import BeautifulSoup
+import os
+import re
+import tempfile
 import time
 import random
-import json
-from urllib.parse import urljoin, quote
-from app import app, db
-from models import Hotel, City, HotelCategory
-import re
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from app import app, db, configure_logging
+from models import City, HotelCategory
+from reference import invalidate_reference_data
+from catalogue import bump_catalogue_version
+from ingest import upsert_hotels
+import metrics
+
+BOOKING_SEARCH_URL = "https://www.booking.com/searchresults.html"
+
+logger = logging.getLogger(__name__)
+
+# Request pacing, overridable from the environment
+SCRAPER_RATE = float(os.environ.get("SCRAPER_RATE", 0.3))  # requests per second per host
+SCRAPER_BURST = int(os.environ.get("SCRAPER_BURST", 2))
+SCRAPER_CONCURRENCY = int(os.environ.get("SCRAPER_CONCURRENCY", 4))  # in-flight requests per host
+SCRAPER_PARSER = os.environ.get("SCRAPER_PARSER")  # lxml, soup-lxml or soup; see hotel_parsers.py
+
+# On-disk response cache (see http_cache.py); an empty SCRAPER_CACHE_DIR disables it
+SCRAPER_CACHE_DIR = os.environ.get("SCRAPER_CACHE_DIR", os.path.join(tempfile.gettempdir(), "scraper-http-cache"))
+SCRAPER_CACHE_TTL = int(os.environ.get("SCRAPER_CACHE_TTL", 3600))  # seconds before revalidating
+SCRAPER_CACHE_MAX_BYTES = int(os.environ.get("SCRAPER_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+SCRAPER_OFFLINE = os.environ.get("SCRAPER_OFFLINE", "").lower() in ("1", "true", "yes")  # replay cached pages only
+
+PRICE_RE = re.compile(r'\d+')
+RATING_RE = re.compile(r'(\d+\.?\d*)')
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+class TokenBucket:
+    """Thread-safe token bucket allowing ``rate`` acquisitions per second, in bursts of up to ``capacity``"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class HostRateLimiter:
+    """Per-host token buckets plus a cap on concurrent requests to each host"""
+
+    def __init__(self, rate=SCRAPER_RATE, burst=SCRAPER_BURST, max_concurrency=SCRAPER_CONCURRENCY):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, host):
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = (TokenBucket(self.rate, self.burst),
+                                     threading.BoundedSemaphore(self.max_concurrency))
+            return self._hosts[host]
+
+    @contextmanager
+    def slot(self, url):
+        """Wait for permission to send one request to the host of ``url``"""
+        bucket, semaphore = self._host(urlsplit(url).netloc)
+        with semaphore:
+            bucket.acquire()
+            yield
+
+def default_http_cache():
+    """HTTPCache configured from the SCRAPER_CACHE_* settings, or None when disabled"""
+    if not SCRAPER_CACHE_DIR:
+        return None
+    from http_cache import HTTPCache
+    return HTTPCache(SCRAPER_CACHE_DIR, ttl=SCRAPER_CACHE_TTL,
+                     max_bytes=SCRAPER_CACHE_MAX_BYTES, offline=SCRAPER_OFFLINE)
 
 class BookingScraper:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        })
+    def __init__(self, search_url=BOOKING_SEARCH_URL, limiter=None, retry_delay=5.0, parser=SCRAPER_PARSER,
+                 http_cache=None):
+        # requests and the parser backends are imported on first use, so
+        # importing this module (as the web app's job runner does) stays cheap
+        from hotel_parsers import get_parser
+        self.search_url = search_url
+        self.parser = get_parser(parser)
+        self.http_cache = http_cache if http_cache is not None else default_http_cache()
+        self.limiter = limiter or HostRateLimiter()
+        self.retry_delay = retry_delay
+        # requests.Session is not thread-safe, so each worker thread gets its own
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        if not hasattr(self._local, 'session'):
+            import requests
+            self._local.session = requests.Session()
+            self._local.session.headers.update(HEADERS)
+        return self._local.session
         
     def get_page(self, url, params=None, retries=3):
-        """Get a page with retries and rate limiting"""
+        """Get a page through the HTTP cache, fetching with retries when needed"""
+        if self.http_cache is None:
+            return self.fetch_page(url, params, retries=retries)
+        return self.http_cache.get(url, params, lambda headers: self.fetch_page(url, params, headers, retries))
+
+    def fetch_page(self, url, params=None, headers=None, retries=3):
+        """Fetch a page with retries, paced by the per-host rate limiter"""
         for attempt in range(retries):
             try:
-                # Random delay between requests
-                time.sleep(random.uniform(2, 5))
-                
-                response = self.session.get(url, params=params, timeout=15)
+                with self.limiter.slot(url):
+                    response = self.session.get(url, params=params, headers=headers, timeout=15)
                 response.raise_for_status()
                 return response
             except Exception as e:
-                print(f"Attempt {attempt + 1} failed for {url}: {e}")
+                logger.warning("Attempt %d failed for %s: %s", attempt + 1, url, e)
                 if attempt == retries - 1:
                     raise
-                time.sleep(random.uniform(5, 10))
+                # Exponential backoff with jitter before retrying
+                time.sleep(self.retry_delay * 2 ** attempt * random.uniform(1, 1.5))
     
     def search_hotels_in_city(self, city_name, checkin="2024-12-01", checkout="2024-12-02", limit=20):
         """Search for hotels in a specific Moroccan city"""
-        # Booking.com search URL
-        search_url = f"https://www.booking.com/searchresults.html"
-        
         params = {
             'ss': f"{city_name}, Morocco",
             'checkin_year': checkin.split('-')[0],
@@ -61,93 +164,56 @@ class BookingScraper:
             'offset': '0'
         }
         
-        print(f"Searching for hotels in {city_name}...")
+        logger.info("Searching for hotels in %s", city_name)
         
         try:
-            response = self.get_page(search_url, params=params)
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
+            response = self.get_page(self.search_url, params=params)
             hotels = []
-            hotel_elements = soup.find_all('div', {'data-testid': 'property-card'})
-            
-            if not hotel_elements:
-                # Try alternative selectors
-                hotel_elements = soup.find_all('div', class_=re.compile('sr_item'))
+            hotel_elements = self.parser.cards(response.content)
                 
-            print(f"Found {len(hotel_elements)} hotel elements")
+            logger.debug("Found %d hotel elements", len(hotel_elements), extra={'city': city_name})
             
             for i, hotel_element in enumerate(hotel_elements[:limit]):
                 try:
                     hotel_data = self.extract_hotel_data(hotel_element, city_name)
                     if hotel_data:
                         hotels.append(hotel_data)
-                        print(f"Extracted: {hotel_data['name']}")
-                    
-                    # Rate limiting
-                    time.sleep(random.uniform(1, 3))
+                        logger.debug("Extracted %s", hotel_data['name'], extra={'city': city_name})
                     
                 except Exception as e:
-                    print(f"Error extracting hotel {i}: {e}")
+                    logger.warning("Error extracting hotel %d in %s: %s", i, city_name, e)
                     continue
                     
             return hotels
             
         except Exception as e:
-            print(f"Error searching hotels in {city_name}: {e}")
+            logger.error("Error searching hotels in %s: %s", city_name, e)
             return []
     
     def extract_hotel_data(self, hotel_element, city_name):
         """Extract hotel data from a hotel element"""
         try:
-            # Hotel name
-            name_element = hotel_element.find('h3') or hotel_element.find('h2') or hotel_element.find('a', {'data-testid': 'title-link'})
-            name = name_element.get_text(strip=True) if name_element else "Unknown Hotel"
-            
-            # Address
-            address_element = hotel_element.find('span', {'data-testid': 'address'}) or hotel_element.find('span', class_=re.compile('address'))
-            address = address_element.get_text(strip=True) if address_element else f"{city_name}, Morocco"
-            
-            # Price
-            price_element = hotel_element.find('span', {'data-testid': 'price-and-discounted-price'}) or hotel_element.find('div', class_=re.compile('price'))
-            price_text = price_element.get_text(strip=True) if price_element else "0"
-            price = self.extract_price(price_text)
-            
-            # Rating
-            rating_element = hotel_element.find('div', {'data-testid': 'review-score'}) or hotel_element.find('div', class_=re.compile('rating'))
-            rating = self.extract_rating(rating_element.get_text(strip=True) if rating_element else "0")
-            
-            # Review text
-            review_element = hotel_element.find('div', {'data-testid': 'review-score-word'}) or hotel_element.find('span', class_=re.compile('review'))
-            review_text = review_element.get_text(strip=True) if review_element else "No reviews"
-            
-            # Description (limited from search results)
-            desc_element = hotel_element.find('div', class_=re.compile('important_facility')) or hotel_element.find('div', class_=re.compile('facility'))
-            description = desc_element.get_text(strip=True) if desc_element else f"Hotel in {city_name}, Morocco"
-            
-            # Image URL
-            img_element = hotel_element.find('img')
-            image_url = img_element.get('src') or img_element.get('data-src') if img_element else None
-            
+            fields = self.parser.fields(hotel_element)
             return {
-                'name': name,
-                'description': description,
-                'address': address,
-                'rating': rating,
-                'price_per_night': price,
-                'review_text': review_text,
-                'image_url': image_url,
+                'name': fields['name'] or "Unknown Hotel",
+                'description': fields['description'] or f"Hotel in {city_name}, Morocco",
+                'address': fields['address'] or f"{city_name}, Morocco",
+                'rating': self.extract_rating(fields['rating'] or "0"),
+                'price_per_night': self.extract_price(fields['price'] or "0"),
+                'review_text': fields['review'] or "No reviews",
+                'image_url': fields['image_url'],
                 'city': city_name
             }
             
         except Exception as e:
-            print(f"Error extracting hotel data: {e}")
+            logger.warning("Error extracting hotel data: %s", e)
             return None
     
     def extract_price(self, price_text):
         """Extract numeric price from price text"""
         try:
             # Remove currency symbols and extract numbers
-            numbers = re.findall(r'\d+', price_text.replace(',', ''))
+            numbers = PRICE_RE.findall(price_text.replace(',', ''))
             if numbers:
                 return float(numbers[0])
             return 100.0  # Default price if extraction fails
@@ -158,7 +224,7 @@ class BookingScraper:
         """Extract numeric rating from rating text"""
         try:
             # Look for decimal numbers in rating text
-            rating_match = re.search(r'(\d+\.?\d*)', rating_text)
+            rating_match = RATING_RE.search(rating_text)
             if rating_match:
                 rating = float(rating_match.group(1))
                 # Normalize to 5-star scale if needed
@@ -169,17 +235,21 @@ class BookingScraper:
         except:
             return 4.0
     
-    def save_hotels_to_database(self, hotels_data, city_name):
-        """Save scraped hotels to the database"""
+    def save_hotels_to_database(self, hotels_data, city_name, update_existing=False):
+        """Save scraped hotels to the database in one transaction.
+
+        Returns {'inserted', 'updated', 'skipped'} counts; with
+        ``update_existing`` hotels already saved get the scraped price and rating.
+        """
         with app.app_context():
-            # Find or create city
+            # Find or create city and default category
+            created_reference = False
             city = City.query.filter_by(name=city_name).first()
             if not city:
                 city = City(name=city_name, country="Morocco")
                 db.session.add(city)
-                db.session.commit()
+                created_reference = True
             
-            # Find or create default category
             category = HotelCategory.query.filter_by(name="Scraped Hotel").first()
             if not category:
                 category = HotelCategory(
@@ -187,82 +257,82 @@ class BookingScraper:
                     description="Hotels scraped from Booking.com"
                 )
                 db.session.add(category)
-                db.session.commit()
-            
-            saved_count = 0
-            for hotel_data in hotels_data:
-                try:
-                    # Check if hotel already exists
-                    existing = Hotel.query.filter_by(name=hotel_data['name'], city_id=city.id).first()
-                    if existing:
-                        print(f"Hotel {hotel_data['name']} already exists, skipping...")
-                        continue
-                    
-                    # Create new hotel
-                    hotel = Hotel(
-                        name=hotel_data['name'],
-                        description=hotel_data['description'],
-                        address=hotel_data['address'],
-                        rating=hotel_data['rating'],
-                        price_per_night=hotel_data['price_per_night'],
-                        amenities=f"Review: {hotel_data['review_text']}",
-                        image_url=hotel_data['image_url'],
-                        is_available=True,
-                        city_id=city.id,
-                        category_id=category.id
-                    )
-                    
-                    db.session.add(hotel)
-                    saved_count += 1
-                    
-                except Exception as e:
-                    print(f"Error saving hotel {hotel_data['name']}: {e}")
-                    continue
+                created_reference = True
+            db.session.flush()
             
+            rows = [{
+                'name': hotel_data['name'],
+                'description': hotel_data['description'],
+                'address': hotel_data['address'],
+                'rating': hotel_data['rating'],
+                'price_per_night': hotel_data['price_per_night'],
+                'amenities': f"Review: {hotel_data['review_text']}",
+                'image_url': hotel_data['image_url'],
+                'is_available': True,
+                'city_id': city.id,
+                'category_id': category.id,
+            } for hotel_data in hotels_data]
+            counts = upsert_hotels(rows, update_existing=update_existing)
             db.session.commit()
-            print(f"Saved {saved_count} new hotels to database")
-            return saved_count
+            for result, count in counts.items():
+                metrics.inc('scraper_hotels_total', count, result=result)
+            
+            if created_reference:
+                invalidate_reference_data()  # also bumps the catalogue version
+            elif counts['inserted'] or counts['updated']:
+                bump_catalogue_version()
+            logger.info("Saved hotels for %s: %d inserted, %d updated, %d skipped", city_name,
+                        counts['inserted'], counts['updated'], counts['skipped'], extra={'city': city_name, **counts})
+            return counts
 
-def scrape_moroccan_cities(cities=None, limit_per_city=10):
-    """Scrape hotels from multiple Moroccan cities"""
+def scrape_moroccan_cities(cities=None, limit_per_city=10, scraper=None, max_workers=None, on_city_done=None):
+    """Scrape hotels from multiple Moroccan cities concurrently.
+
+    Cities are fetched on a thread pool; requests are paced by the scraper's
+    per-host rate limiter and results are saved from the calling thread.
+    ``on_city_done(city, counts)`` is called after each city (counts is None
+    when nothing was saved); returning False stops the remaining cities.
+    """
     if cities is None:
         cities = [
             "Casablanca", "Marrakech", "Rabat", "Fez", 
             "Tangier", "Agadir", "Essaouira", "Chefchaouen"
         ]
     
-    scraper = BookingScraper()
+    scraper = scraper or BookingScraper()
+    max_workers = max_workers or scraper.limiter.max_concurrency
     total_hotels = 0
     
-    for city in cities:
-        print(f"\n{'='*50}")
-        print(f"Scraping hotels in {city}")
-        print(f"{'='*50}")
-        
-        try:
-            hotels = scraper.search_hotels_in_city(city, limit=limit_per_city)
-            if hotels:
-                saved = scraper.save_hotels_to_database(hotels, city)
-                total_hotels += saved
-                print(f"Successfully scraped {len(hotels)} hotels from {city}")
-            else:
-                print(f"No hotels found for {city}")
-                
-        except Exception as e:
-            print(f"Error scraping {city}: {e}")
-            continue
-        
-        # Longer delay between cities
-        print("Waiting before next city...")
-        time.sleep(random.uniform(10, 20))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(scraper.search_hotels_in_city, city, limit=limit_per_city): city
+                   for city in cities}
+        for future in as_completed(futures):
+            city = futures[future]
+            saved = None
+            try:
+                hotels = future.result()
+                if hotels:
+                    saved = scraper.save_hotels_to_database(hotels, city)
+                    total_hotels += saved['inserted']
+                    logger.info("Scraped %d hotels from %s", len(hotels), city)
+                else:
+                    logger.info("No hotels found for %s", city)
+                    
+            except Exception:
+                logger.exception("Error scraping %s", city)
+            
+            if on_city_done is not None and on_city_done(city, saved) is False:
+                logger.info("Scraping stopped")
+                for pending in futures:
+                    pending.cancel()
+                break
     
-    print(f"\n{'='*50}")
-    print(f"Scraping completed! Total hotels saved: {total_hotels}")
-    print(f"{'='*50}")
+    logger.info("Scraping completed: %d hotels saved", total_hotels)
     
     return total_hotels
 
 if __name__ == "__main__":
+    configure_logging()
     # Example usage
     print("Starting Booking.com scraper for Morocco...")
     
@@ -0,0 +1,413 @@
+"""
+Full-text hotel search.
+Queries are matched against hotel name, address, amenities and description,
+ranked by field weight, with accents ignored and common transliterations of
+Moroccan place names folded together ("Fès", "Fes" and "Fez" match each other).
+The last query word also matches as a prefix so search-as-you-type works.
+
+On PostgreSQL the search runs on a weighted tsvector expression and a trigram
+index on the hotel name, created with the hotel_search_unaccent() function by
+migrate.py, init_db() and the seeding scripts. A database without that
+function falls back to the in-process index with a warning. Other backends use
+an in-process inverted index that is built on first use, kept up to date from
+committed hotel writes and rebuilt after SEARCH_INDEX_TTL seconds so writes
+made by other workers show up too. One request rebuilds it while the others
+keep searching the previous contents.
+"""
+
+import bisect
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from sqlalchemy import bindparam, event, func, literal_column, or_, select, text
+from sqlalchemy.orm import Session
+from app import app, db
+from models import Hotel
+from pagination import paginate_hotels, paginate_ranked
+
+app.config.setdefault("SEARCH_BACKEND", "auto")  # auto, postgresql or memory
+app.config.setdefault("SEARCH_MAX_RESULTS", 500)
+app.config.setdefault("SEARCH_INDEX_TTL", 300)
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Relative weight of a match in each searchable field
+FIELD_WEIGHTS = {
+    'name': 4.0,
+    'address': 2.0,
+    'amenities': 1.5,
+    'description': 1.0,
+}
+
+# Spellings of the same place name; a query for one matches all of them
+PLACE_NAME_VARIANTS = [
+    ('fes', 'fez'),
+    ('marrakech', 'marrakesh', 'marakech'),
+    ('tangier', 'tanger', 'tangiers', 'tanja'),
+    ('meknes', 'miknas'),
+    ('chefchaouen', 'chaouen', 'chefchaouene', 'xauen'),
+    ('essaouira', 'mogador'),
+    ('ouarzazate', 'warzazat'),
+    ('tetouan', 'tetuan'),
+    ('oujda', 'ujda'),
+]
+VARIANTS = {name: group for group in PLACE_NAME_VARIANTS for name in group}
+
+# Number of vocabulary words the trailing prefix may expand to
+MAX_PREFIX_EXPANSIONS = 50
+
+
+def normalize(value):
+    """Lower-case text and strip accents ("Fès" -> "fes")"""
+    decomposed = unicodedata.normalize('NFKD', value or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(value):
+    """Split text into normalized search tokens"""
+    return TOKEN_RE.findall(normalize(value))
+
+
+def expand(token):
+    """All spellings a query token should match"""
+    return VARIANTS.get(token, (token,))
+
+
+def _index_document(postings, documents, hotel_id, fields):
+    """Add one hotel's weighted tokens to ``postings`` and ``documents``; returns its tokens"""
+    frequencies = defaultdict(float)
+    for field, weight in FIELD_WEIGHTS.items():
+        for token in tokenize(fields.get(field)):
+            frequencies[token] += weight
+    for token, frequency in frequencies.items():
+        postings[token][hotel_id] = frequency
+    documents[hotel_id] = list(frequencies)
+    return documents[hotel_id]
+
+
+class InvertedIndex:
+    """In-process inverted index of hotels for backends without full-text search"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)  # token -> {hotel_id: weighted term frequency}
+        self._documents = {}  # hotel_id -> tokens, used to remove a hotel
+        self._vocabulary = []  # sorted tokens, for prefix lookups
+        self._build_lock = threading.Lock()  # one rebuild at a time
+        self._pending = None  # hotel_id -> fields or None, written during a rebuild
+        self.built_at = None
+
+    def __len__(self):
+        return len(self._documents)
+
+    @property
+    def is_built(self):
+        return self.built_at is not None
+
+    def build(self, rows):
+        """Replace the index contents with ``rows`` of (id, name, address, amenities, description).
+
+        The new contents are built without holding the lock, so searches keep
+        using the old ones meanwhile; hotels added or removed during the build
+        are applied again after the swap.
+        """
+        with self._lock:
+            self._pending = {}
+        try:
+            postings = defaultdict(dict)
+            documents = {}
+            for row in rows:
+                _index_document(postings, documents, row[0], dict(zip(FIELD_WEIGHTS, row[1:])))
+            vocabulary = sorted(postings)
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            self._postings, self._documents, self._vocabulary = postings, documents, vocabulary
+            pending, self._pending = self._pending, None
+            for hotel_id, fields in pending.items():
+                if fields is None:
+                    self.remove(hotel_id)
+                else:
+                    self.add(hotel_id, fields)
+            self.built_at = time.monotonic()
+
+    def refresh(self, load_rows, max_age):
+        """Rebuild from ``load_rows()`` if never built or built over ``max_age``
+        seconds ago. Returns True if this call rebuilt the index.
+
+        Only one thread rebuilds; while it does, the others search the old
+        contents, or wait for it if there are none yet.
+        """
+        if self.is_built and time.monotonic() - self.built_at <= max_age:
+            return False
+        if not self._build_lock.acquire(blocking=not self.is_built):
+            return False
+        try:
+            if self.is_built and time.monotonic() - self.built_at <= max_age:
+                return False
+            self.build(load_rows())
+            return True
+        finally:
+            self._build_lock.release()
+
+    def add(self, hotel_id, fields):
+        """Index or re-index one hotel from a dict of field values"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending[hotel_id] = fields
+            self._remove(hotel_id)
+            for token in self._add(hotel_id, fields):
+                index = bisect.bisect_left(self._vocabulary, token)
+                if index == len(self._vocabulary) or self._vocabulary[index] != token:
+                    self._vocabulary.insert(index, token)
+
+    def remove(self, hotel_id):
+        """Drop one hotel from the index"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending[hotel_id] = None
+            self._remove(hotel_id)
+
+    def invalidate(self):
+        """Force a rebuild on the next search"""
+        self.built_at = None
+
+    def _add(self, hotel_id, fields):
+        return _index_document(self._postings, self._documents, hotel_id, fields)
+
+    def _remove(self, hotel_id):
+        for token in self._documents.pop(hotel_id, ()):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(hotel_id, None)
+
+    def _prefix_matches(self, prefix):
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        matches = []
+        for token in self._vocabulary[start:]:
+            if not token.startswith(prefix) or len(matches) >= MAX_PREFIX_EXPANSIONS:
+                break
+            matches.append(token)
+        return matches
+
+    def search(self, query, limit=None):
+        """Return up to ``limit`` (hotel_id, score) pairs, best match first"""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with self._lock:
+            total = max(len(self._documents), 1)
+            combined = None
+            for position, token in enumerate(tokens):
+                terms = set(expand(token))
+                if position == len(tokens) - 1:
+                    for variant in list(terms):
+                        terms.update(self._prefix_matches(variant))
+                scores = {}
+                for term in terms:
+                    postings = self._postings.get(term)
+                    if not postings:
+                        continue
+                    idf = math.log(1 + total / len(postings))
+                    for hotel_id, frequency in postings.items():
+                        score = frequency * idf
+                        if score > scores.get(hotel_id, 0.0):
+                            scores[hotel_id] = score
+                if combined is None:
+                    combined = scores
+                else:
+                    combined = {hotel_id: combined[hotel_id] + score
+                                for hotel_id, score in scores.items() if hotel_id in combined}
+                if not combined:
+                    return []
+        ranked = sorted(combined.items(), key=lambda item: (-item[1], -item[0]))
+        return ranked if limit is None else ranked[:limit]
+
+
+memory_index = InvertedIndex()
+
+# Weighted document expression; the index in migrate.py and the search query
+# must use the same expression for PostgreSQL to pick the index
+PG_DOCUMENT = " || ".join(
+    f"setweight(to_tsvector('simple', hotel_search_unaccent(coalesce({{table}}{field}, ''))), '{weight}')"
+    for field, weight in zip(FIELD_WEIGHTS, 'ABCD')
+)
+PG_NAME = "hotel_search_unaccent(lower({table}name))"
+
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    # unaccent() is only STABLE; an IMMUTABLE wrapper can be used in indexes
+    "CREATE OR REPLACE FUNCTION hotel_search_unaccent(text) RETURNS text "
+    "AS $$ SELECT public.unaccent('public.unaccent', $1) $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT",
+    f"CREATE INDEX IF NOT EXISTS ix_hotel_search_document ON hotel USING gin (({PG_DOCUMENT.format(table='')}))",
+    f"CREATE INDEX IF NOT EXISTS ix_hotel_name_trgm ON hotel USING gin (({PG_NAME.format(table='')}) gin_trgm_ops)",
+]
+
+
+def pg_search_statement(params=None):
+    """SELECT of (hotel id, score) for the :tsquery and :term parameters, best
+    match first, restricted to hotels matching the ``params`` filters"""
+    document = literal_column(f"({PG_DOCUMENT.format(table='hotel.')})")
+    name = literal_column(PG_NAME.format(table='hotel.'))
+    query = func.to_tsquery(literal_column("'simple'"), bindparam('tsquery'))
+    term = bindparam('term')
+    score = (func.ts_rank(document, query) + func.similarity(name, term)).label('score')
+    statement = select(Hotel.id, score).where(or_(document.bool_op('@@')(query), name.bool_op('%')(term)))
+    if params is not None:
+        statement = filter_hotels(statement, params)
+    return statement.order_by(score.desc(), Hotel.id.desc())
+
+
+def create_postgres_search_indexes(connection):
+    """Install the unaccent/trigram extensions and full-text indexes"""
+    for statement in POSTGRES_DDL:
+        connection.execute(text(statement))
+
+
+def to_tsquery(tokens):
+    """Build a tsquery string: tokens ANDed, variants ORed, last token as a prefix"""
+    clauses = []
+    for position, token in enumerate(tokens):
+        suffix = ':*' if position == len(tokens) - 1 else ''
+        clauses.append('(' + ' | '.join(variant + suffix for variant in expand(token)) + ')')
+    return ' & '.join(clauses)
+
+
+_postgres_search = {}  # database URL -> whether the search function is installed
+
+
+def postgres_search_installed():
+    """Whether the database has hotel_search_unaccent(), checked once per process"""
+    url = str(db.engine.url)
+    if url not in _postgres_search:
+        installed = db.session.execute(
+            text("SELECT to_regprocedure('hotel_search_unaccent(text)') IS NOT NULL")).scalar()
+        if not installed:
+            logger.warning("PostgreSQL search function missing; run migrate.py and restart. "
+                           "Searching with the in-process index meanwhile.")
+        _postgres_search[url] = installed
+    return _postgres_search[url]
+
+
+def backend():
+    """Name of the search backend in use"""
+    configured = app.config['SEARCH_BACKEND']
+    if configured != 'auto':
+        return configured
+    if db.engine.dialect.name == 'postgresql' and postgres_search_installed():
+        return 'postgresql'
+    return 'memory'
+
+
+def _index_rows():
+    rows = db.session.query(Hotel.id, *(getattr(Hotel, field) for field in FIELD_WEIGHTS))
+    return rows.execution_options(yield_per=5000)
+
+
+def search_hotels(query, params=None, limit=None):
+    """Return (hotel_id, score) pairs for ``query``, best match first.
+
+    With ``params`` only hotels matching those filters (see filter_hotels)
+    are ranked, so ``limit`` never cuts off matches the filters would keep.
+    ``limit=None`` returns every match.
+    """
+    if backend() == 'postgresql':
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        statement = pg_search_statement(params)
+        if limit is not None:
+            statement = statement.limit(limit)
+        rows = db.session.execute(statement, {'tsquery': to_tsquery(tokens), 'term': ' '.join(tokens)})
+        return [(hotel_id, float(score)) for hotel_id, score in rows]
+
+    if memory_index.refresh(_index_rows, app.config['SEARCH_INDEX_TTL']):
+        logger.info("Search index built with %d hotels", len(memory_index))
+    ranked = memory_index.search(query)
+    if limit is None or len(ranked) <= limit:
+        return ranked
+    if params is not None:
+        # Only worth a query when the cut would drop matches the filters keep
+        candidates = {hotel_id for (hotel_id,) in filter_hotels(db.session.query(Hotel.id), params)}
+        ranked = [(hotel_id, score) for hotel_id, score in ranked if hotel_id in candidates]
+    return ranked[:limit]
+
+
+def hotel_search_params(args):
+    """The HotelSearchForm filters in request ``args``, parsed as the /hotels page does"""
+    return {
+        'search': args.get('search', ''),
+        'city_id': args.get('city_id', type=int),
+        'category_id': args.get('category_id', type=int),
+        'min_price': args.get('min_price', type=float),
+        'max_price': args.get('max_price', type=float),
+        'min_rating': args.get('min_rating', type=float),
+    }
+
+
+def filter_hotels(query, params):
+    """Restrict a hotel query or select() to available hotels matching ``params``, except the text search"""
+    query = query.filter(Hotel.is_available == True)  # noqa: E712
+    if params['city_id']:
+        query = query.filter(Hotel.city_id == params['city_id'])
+    if params['category_id']:
+        query = query.filter(Hotel.category_id == params['category_id'])
+    if params['min_price']:
+        query = query.filter(Hotel.price_per_night >= params['min_price'])
+    if params['max_price']:
+        query = query.filter(Hotel.price_per_night <= params['max_price'])
+    if params['min_rating']:
+        query = query.filter(Hotel.rating >= params['min_rating'])
+    return query
+
+
+def search_page(query, params, after=None, before=None, per_page=20):
+    """One KeysetPage of hotels from ``query`` matching ``params``.
+
+    Text searches are ordered by relevance, everything else by rating.
+    """
+    query = filter_hotels(query, params)
+    if params['search']:
+        ranking = search_hotels(params['search'], params, app.config['SEARCH_MAX_RESULTS'])
+        return paginate_ranked(query, ranking,
+                               after=after, before=before, per_page=per_page)
+    return paginate_hotels(query, after=after, before=before, per_page=per_page)
+
+
+# Keep the in-process index in step with hotels written through the ORM.
+# Changes are captured at flush time and applied only once committed.
+
+@event.listens_for(Session, 'after_flush')
+def _collect_hotel_changes(session, flush_context):
+    if not memory_index.is_built:
+        return
+    changes = session.info.setdefault('search_changes', {})
+    for hotel in list(session.new) + list(session.dirty):
+        if isinstance(hotel, Hotel):
+            changes[hotel.id] = {field: getattr(hotel, field) for field in FIELD_WEIGHTS}
+    for hotel in session.deleted:
+        if isinstance(hotel, Hotel):
+            changes[hotel.id] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_hotel_changes(session):
+    for hotel_id, fields in session.info.pop('search_changes', {}).items():
+        if fields is None:
+            memory_index.remove(hotel_id)
+        else:
+            memory_index.add(hotel_id, fields)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_hotel_changes(session):
+    session.info.pop('search_changes', None)
@@ -5,6 +5,7 @@ Run this script after setting up the database to populate it with sample data.
 
 from app import app, db
 from models import User, City, HotelCategory, Hotel
+from migrate import create_search_indexes
 from werkzeug.security import generate_password_hash
 
 def create_sample_data():
@@ -15,6 +16,7 @@ def create_sample_data():
         print("Clearing existing data...")
         db.drop_all()
         db.create_all()
+        create_search_indexes()
         
         # Create admin user
         print("Creating admin user...")
@@ -0,0 +1,120 @@
+"""
+Admin dashboard statistics.
+All counts and the per-city/per-category distributions come from a single
+UNION ALL statement, which also reads the 'catalogue' and 'users'
+DataVersions the counts were taken at. Each worker caches the result for up
+to DASHBOARD_STATS_TTL seconds and re-reads the versions at most every
+DATA_VERSION_CHECK_INTERVAL seconds, recomputing when any writer (admin
+routes, scraper, job runner, another worker) bumped one of them. The worker
+that made a change drops its copy at once through invalidate_dashboard_stats().
+"""
+
+import threading
+import time
+from sqlalchemy import case, func, literal, select, union_all
+from app import app, db
+from catalogue import CATALOGUE_VERSION
+from models import User, City, HotelCategory, Hotel, DataVersion
+from user_cache import USERS_VERSION
+
+app.config.setdefault("DASHBOARD_STATS_TTL", 60)
+app.config.setdefault("DATA_VERSION_CHECK_INTERVAL", 5)
+
+RECENT_HOTELS = 5
+
+STATS_VERSIONS = (CATALOGUE_VERSION, USERS_VERSION)
+
+_lock = threading.Lock()
+_state = {'value': None, 'versions': None, 'loaded_at': 0.0, 'checked_at': 0.0}
+
+
+def _aggregate_statement():
+    """One statement returning (kind, label, count) rows for the whole dashboard"""
+    availability = case((Hotel.is_available, 'available_hotels'), else_='unavailable_hotels')
+    return union_all(
+        select(literal('stat'), literal('total_users'), func.count(User.id)),
+        select(literal('stat'), literal('total_cities'), func.count(City.id)),
+        select(literal('stat'), literal('total_categories'), func.count(HotelCategory.id)),
+        select(literal('stat'), availability, func.count(Hotel.id)).group_by(availability),
+        select(literal('city'), City.name, func.count(Hotel.id)).join(Hotel).group_by(City.name),
+        select(literal('category'), HotelCategory.name, func.count(Hotel.id)).join(Hotel).group_by(HotelCategory.name),
+        select(literal('version'), DataVersion.name, DataVersion.version).where(DataVersion.name.in_(STATS_VERSIONS)),
+    )
+
+
+def _versions(rows):
+    """Tuple of the STATS_VERSIONS numbers in (name, version) ``rows``"""
+    versions = dict(rows)
+    return tuple(versions.get(name, 0) for name in STATS_VERSIONS)
+
+
+def _current_versions():
+    return _versions(db.session.query(DataVersion.name, DataVersion.version)
+                     .filter(DataVersion.name.in_(STATS_VERSIONS)))
+
+
+def _compute():
+    """The dashboard statistics and the data versions they were taken at"""
+    stats = dict.fromkeys(['total_users', 'total_hotels', 'total_cities',
+                           'total_categories', 'available_hotels'], 0)
+    city_data = []
+    category_data = []
+    versions = []
+    for kind, label, count in db.session.execute(_aggregate_statement()):
+        if kind == 'version':
+            versions.append((label, count))
+        elif kind == 'city':
+            city_data.append((label, count))
+        elif kind == 'category':
+            category_data.append((label, count))
+        elif label in ('available_hotels', 'unavailable_hotels'):
+            stats['total_hotels'] += count
+            if label == 'available_hotels':
+                stats['available_hotels'] = count
+        else:
+            stats[label] = count
+
+    # Plain rows rather than ORM objects so they can outlive the session
+    recent_hotels = db.session.execute(
+        select(Hotel.id, Hotel.name, Hotel.price_per_night, Hotel.rating,
+               Hotel.is_available, Hotel.created_at,
+               City.name.label('city_name'), HotelCategory.name.label('category_name'))
+        .join(City, Hotel.city_id == City.id)
+        .join(HotelCategory, Hotel.category_id == HotelCategory.id)
+        .order_by(Hotel.created_at.desc())
+        .limit(RECENT_HOTELS)
+    ).all()
+
+    return {
+        'stats': stats,
+        'recent_hotels': recent_hotels,
+        'city_data': city_data,
+        'category_data': category_data,
+    }, _versions(versions)
+
+
+def compute_dashboard_stats():
+    """Query the dashboard statistics, bypassing the cache"""
+    return _compute()[0]
+
+
+def get_dashboard_stats():
+    """Dashboard statistics, served from the cache while their versions are current"""
+    now = time.monotonic()
+    if _state['versions'] is not None and now - _state['loaded_at'] < app.config['DASHBOARD_STATS_TTL']:
+        if now - _state['checked_at'] < app.config['DATA_VERSION_CHECK_INTERVAL']:
+            return _state['value']
+        if _current_versions() == _state['versions']:
+            _state['checked_at'] = now
+            return _state['value']
+    value, versions = _compute()
+    with _lock:
+        _state['value'], _state['versions'] = value, versions
+        _state['loaded_at'] = _state['checked_at'] = now
+    return value
+
+
+def invalidate_dashboard_stats():
+    """Drop this worker's statistics after a write; other workers see the bumped versions"""
+    with _lock:
+        _state['versions'] = None
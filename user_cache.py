@@ -0,0 +1,86 @@
+"""
+Cached Flask-Login user loader.
+Authenticated requests need the user's id, username and admin flag, not the
+full row, so each worker keeps those in a TTLCache for USER_CACHE_TTL seconds
+instead of loading the user on every request.
+
+Creating, editing or deleting a user bumps the 'users' DataVersion, which
+also keys the dashboard's user count. The worker that made the change drops
+its cache at once. Other workers re-read the version at most every
+DATA_VERSION_CHECK_INTERVAL seconds and drop theirs when it moved, so a
+revoked admin flag lasts no longer than that anywhere.
+"""
+
+import time
+from flask_login import UserMixin, user_logged_in
+from app import app, db
+from cache import TTLCache
+from models import User, DataVersion
+
+app.config.setdefault("USER_CACHE_TTL", 60)
+app.config.setdefault("DATA_VERSION_CHECK_INTERVAL", 5)
+
+USERS_VERSION = 'users'
+
+_cache = TTLCache()
+_state = {'version': None, 'checked_at': 0.0}
+
+
+class CachedUser(UserMixin):
+    """The identity of a logged-in user, detached from any session"""
+
+    def __init__(self, id, username, is_admin):
+        self.id = id
+        self.username = username
+        self.is_admin = bool(is_admin)
+
+    def __repr__(self):
+        return f'<CachedUser {self.username}>'
+
+
+def _version_unchanged():
+    """False (after emptying the cache) if another worker bumped the users version"""
+    now = time.monotonic()
+    if _state['version'] is not None and now - _state['checked_at'] < app.config['DATA_VERSION_CHECK_INTERVAL']:
+        return True
+    version = DataVersion.current(USERS_VERSION)
+    unchanged = _state['version'] in (None, version)
+    if not unchanged:
+        _cache.invalidate()
+    _state['version'], _state['checked_at'] = version, now
+    return unchanged
+
+
+def load_user(user_id):
+    """CachedUser for ``user_id``, or None if there is no such user.
+
+    Issues at most one query: the version check on a hit, the row on a miss.
+    """
+    user = _cache.get(user_id)
+    if user is not None and _version_unchanged():
+        return user
+    row = db.session.query(User.id, User.username, User.is_admin).filter_by(id=user_id).first()
+    if row is None:
+        return None
+    user = CachedUser(*row)
+    _cache.set(user_id, user, app.config['USER_CACHE_TTL'])
+    return user
+
+
+@user_logged_in.connect_via(app)
+def _remember_logged_in_user(sender, user, **extra):
+    # The login request already has the row; spare the next request a miss
+    _cache.set(user.id, CachedUser(user.id, user.username, user.is_admin), app.config['USER_CACHE_TTL'])
+
+
+def invalidate_user(user_id):
+    """Bump the shared version after a user was created, changed or deleted and committed"""
+    DataVersion.bump(USERS_VERSION)
+    db.session.commit()
+    _cache.invalidate(user_id)
+
+
+def clear_user_cache():
+    """Empty this worker's cache without bumping the shared version"""
+    _cache.invalidate()
+    _state['version'] = None